@@ -109,12 +109,29 @@ with tab2:
     
     query = st.text_input("输入你的问题")
     
+    # 过滤条件会下推到后端的向量检索
+    with st.expander("过滤条件"):
+        filter_extensions = st.multiselect("文件类型", ["pdf", "docx", "txt"])
+        filter_concepts = st.text_input("概念标签（逗号分隔）")
+        use_date_range = st.checkbox("按上传日期过滤")
+        if use_date_range:
+            date_range = st.date_input("上传日期范围", value=(datetime.now().date(), datetime.now().date()))
+    
     if query and st.button("搜索"):
         with st.spinner("正在搜索相关信息..."):
             try:
+                search_data = {"query": query}
+                if filter_extensions:
+                    search_data["extensions"] = ",".join(filter_extensions)
+                if filter_concepts:
+                    search_data["concepts"] = filter_concepts
+                if use_date_range and len(date_range) == 2:
+                    search_data["date_from"] = date_range[0].strftime("%Y-%m-%d")
+                    search_data["date_to"] = date_range[1].strftime("%Y-%m-%d")
+                
                 response = requests.post(
                     f"{API_URL}/search",
-                    data={"query": query}
+                    data=search_data
                 )
                 
                 if response.status_code == 200:
@@ -150,6 +167,20 @@ with tab3:
                     df = pd.DataFrame(docs)
                     df.columns = ["文件名", "路径", "大小(KB)"]
                     st.dataframe(df)
+                    
+                    # 删除文档
+                    to_delete = st.selectbox("选择要删除的文档", [doc["filename"] for doc in docs])
+                    compact_after = st.checkbox("删除后压缩向量库", value=False)
+                    if st.button("删除文档"):
+                        delete_response = requests.delete(
+                            f"{API_URL}/documents/{to_delete}",
+                            params={"compact": compact_after}
+                        )
+                        if delete_response.status_code == 200:
+                            result = delete_response.json()
+                            st.success(f"已删除 '{to_delete}'，移除了 {result['chunks_removed']} 个文本块。")
+                        else:
+                            st.error(f"删除失败: {delete_response.text}")
                 else:
                     st.info("知识库中还没有文档，请先上传文档。")
             else:
@@ -181,6 +212,13 @@ with tab4:
             index=0
         )
         
+        # 细节层级选项：cluster 模式下由后端把社区聚合成摘要节点
+        detail = st.selectbox(
+            "细节层级",
+            ["full", "cluster"],
+            index=0
+        )
+        
         # 演示模式选项
         demo_mode = st.checkbox("演示模式", value=False, help="使用示例数据生成图谱")
         
@@ -228,14 +266,19 @@ with tab4:
                 st.write("示例节点:", graph_data["nodes"][0])
             if graph_data["links"]:
                 st.write("示例连接:", graph_data["links"][0])
-        elif refresh or "knowledge_graph" not in st.session_state:
+        elif (refresh or "knowledge_graph" not in st.session_state
+              or st.session_state.get("graph_settings") != (layout, detail)):
             with st.spinner("正在生成知识图谱..."):
                 try:
-                    response = requests.get(f"{API_URL}/knowledge-graph")
+                    response = requests.get(
+                        f"{API_URL}/knowledge-graph",
+                        params={"layout": layout, "detail": detail}
+                    )
                     
                     if response.status_code == 200:
                         graph_data = response.json()
                         st.session_state.knowledge_graph = graph_data
+                        st.session_state.graph_settings = (layout, detail)
                         
                         # 调试输出
                         st.write(f"获取到的节点数量: {len(graph_data['nodes'])}")
@@ -313,14 +356,16 @@ with tab4:
                     for node in G.nodes():
                         if G.nodes[node].get("type") == "document":
                             node_colors.append("#5DA5DA")  # 文档节点蓝色
+                        elif G.nodes[node].get("type") == "cluster":
+                            node_colors.append("#8C8C8C")  # 聚合节点灰色
                         else:
                             node_colors.append("#FAA43A")  # 概念节点橙色
                     
                     # 创建节点大小列表
                     node_sizes = []
                     for node in G.nodes():
-                        if G.nodes[node].get("type") == "document":
-                            node_sizes.append(800)  # 文档节点大一些
+                        if G.nodes[node].get("type") in ("document", "cluster"):
+                            node_sizes.append(800)  # 文档和聚合节点大一些
                         else:
                             node_sizes.append(500)  # 概念节点小一些
                     
@@ -351,10 +396,10 @@ with tab4:
                     # 创建图形
                     plt.figure(figsize=(12, 8))
                     
-                    # 选择布局
-                    if layout == "hierarchical":
-                        pos = nx.spring_layout(G, seed=42)
-                    else:
+                    # 使用后端计算好的坐标，缺少坐标时（如演示数据）才在本地计算
+                    pos = {node["id"]: (node["x"], node["y"]) for node in filtered_nodes
+                           if "x" in node and "y" in node}
+                    if len(pos) < G.number_of_nodes():
                         pos = nx.spring_layout(G, seed=42)
                     
                     # 绘制节点
@@ -393,6 +438,7 @@ with tab4:
                     **节点类型**:
                     - 🔵 蓝色: 文档
                     - 🟠 橙色: 概念或术语
+                    - ⚪ 灰色: 聚合节点（cluster 细节层级下的一组节点）
                     
                     **连接类型**:
                     - 🟢 绿色: 相似关系
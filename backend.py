@@ -1,10 +1,12 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import shutil
 import uuid
 from processor import DocumentProcessor
-import json
+from graph_layout import GraphLayoutEngine
+from snapshot import export_snapshot, import_snapshot, diff_snapshots
+from datetime import datetime
 from typing import List
 
 app = FastAPI(title="个人知识库增强剂")
@@ -20,14 +22,30 @@ app.add_middleware(
 
 # 使用环境变量获取API密钥
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "your_api_key_here")
-document_processor = DocumentProcessor(api_key=ANTHROPIC_API_KEY)
+# 分片数量：大于1时按文档哈希把向量库分到多个分片
+NUM_SHARDS = int(os.environ.get("KNOWLEDGE_NUM_SHARDS", "1"))
+# 进程内量化向量索引：设置为 int8 或 float16 时启用
+VECTOR_INDEX_DTYPE = os.environ.get("KNOWLEDGE_VECTOR_INDEX")
+document_processor = DocumentProcessor(api_key=ANTHROPIC_API_KEY, num_shards=NUM_SHARDS,
+                                       vector_index_dtype=VECTOR_INDEX_DTYPE)
+
+# 冷启动：向量库为空且指定了快照时，直接从快照恢复（不调用嵌入和 Claude 接口）
+SNAPSHOT_PATH = os.environ.get("KNOWLEDGE_SNAPSHOT")
+if SNAPSHOT_PATH and not document_processor.shards:
+    manifest = import_snapshot(document_processor, SNAPSHOT_PATH)
+    print(f"已从快照 {SNAPSHOT_PATH} 恢复 {manifest['chunks']} 个文本块")
+
+layout_engine = GraphLayoutEngine()
+
+# 后台压缩任务的状态
+compaction_status = {"running": False, "last_run": None}
 
 # 确保数据目录存在
 os.makedirs("./data/uploads", exist_ok=True)
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """上传文档并处理"""
+async def upload_file(file: UploadFile = File(...), notebook: str = Form(None)):
+    """上传文档并处理，指定 notebook 时存入该笔记本独立的分片"""
     try:
         # 生成唯一文件名并保存
         file_extension = os.path.splitext(file.filename)[1]
@@ -38,11 +56,15 @@ async def upload_file(file: UploadFile = File(...)):
             shutil.copyfileobj(file.file, buffer)
         
         # 处理文档
-        chunks_count = document_processor.process_document(file_path)
+        chunks_count = document_processor.process_document(
+            file_path, original_name=file.filename, notebook=notebook)
         
         # 提取关键概念
         concepts = document_processor.extract_key_concepts(file_path)
         
+        # 加入全局概念索引
+        document_processor.index_concepts(file_path, concepts)
+        
         return {
             "filename": file.filename,
             "stored_path": file_path,
@@ -52,15 +74,78 @@ async def upload_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"处理文件时出错: {str(e)}")
 
+@app.post("/upload/batch")
+async def upload_files(files: List[UploadFile] = File(...), notebook: str = Form(None)):
+    """批量上传文档：多个文档在进程池中并行切分"""
+    try:
+        file_paths = []
+        for file in files:
+            file_extension = os.path.splitext(file.filename)[1]
+            file_path = f"./data/uploads/{uuid.uuid4()}{file_extension}"
+            with open(file_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+            file_paths.append(file_path)
+        
+        chunk_counts = document_processor.process_documents(
+            file_paths, original_names=[file.filename for file in files], notebook=notebook)
+        
+        results = []
+        for file, file_path, chunks_count in zip(files, file_paths, chunk_counts):
+            concepts = document_processor.extract_key_concepts(file_path)
+            document_processor.index_concepts(file_path, concepts)
+            results.append({
+                "filename": file.filename,
+                "stored_path": file_path,
+                "chunks_processed": chunks_count,
+                "key_concepts": concepts
+            })
+        return {"documents": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"处理文件时出错: {str(e)}")
+
 @app.post("/search")
-async def search(query: str = Form(...)):
-    """搜索知识库"""
+async def search(
+    query: str = Form(...),
+    top_k: int = Form(5),
+    two_stage: bool = Form(False),
+    top_m: int = Form(3),
+    per_doc_cap: int = Form(0),
+    file_names: str = Form(None),
+    extensions: str = Form(None),
+    date_from: str = Form(None),
+    date_to: str = Form(None),
+    concepts: str = Form(None),
+    notebook: str = Form(None),
+):
+    """搜索知识库
+
+    过滤条件均为可选：file_names / extensions / concepts 为逗号分隔的列表，
+    date_from / date_to 为 YYYY-MM-DD 格式的上传日期（包含当天）。
+    """
+    def split_list(value):
+        return [item.strip() for item in value.split(",") if item.strip()] if value else None
+    
+    try:
+        filters = {
+            "file_names": split_list(file_names),
+            "extensions": split_list(extensions),
+            "concepts": split_list(concepts),
+            "date_from": datetime.strptime(date_from, "%Y-%m-%d").timestamp() if date_from else None,
+            "date_to": datetime.strptime(date_to, "%Y-%m-%d").timestamp() + 86399 if date_to else None,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"日期格式错误: {str(e)}")
+    
     try:
-        results = document_processor.search(query)
+        results, shard_latency_ms = document_processor.search_with_stats(
+            query, top_k=top_k, two_stage=two_stage, top_m=top_m,
+            per_doc_cap=per_doc_cap or None, filters=filters, notebook=notebook
+        )
         if not results:
-            return {"answer": "未找到相关信息", "sources": []}
+            return {"answer": "未找到相关信息", "sources": [], "shard_latency_ms": shard_latency_ms}
         
         response = document_processor.generate_answer(query, results)
+        response["shard_latency_ms"] = shard_latency_ms
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索时出错: {str(e)}")
@@ -84,9 +169,113 @@ async def list_documents():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取文档列表时出错: {str(e)}")
 
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str, background_tasks: BackgroundTasks, compact: bool = False):
+    """删除文档及其向量、概念缓存和图谱数据"""
+    uploads_dir = "./data/uploads"
+    # 只接受 /documents 返回的文件名，防止路径穿越
+    if os.path.basename(document_id) != document_id:
+        raise HTTPException(status_code=400, detail=f"无效的文档ID: {document_id}")
+    file_path = f"{uploads_dir}/{document_id}"
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"未找到文档: {document_id}")
+    
+    try:
+        removed_chunks = document_processor.delete_document(file_path)
+        layout_engine.remove_nodes([document_id])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"删除文档时出错: {str(e)}")
+    
+    if compact:
+        background_tasks.add_task(run_compaction)
+    return {"deleted": document_id, "chunks_removed": removed_chunks, "compaction_scheduled": compact}
+
+def run_compaction():
+    """后台压缩向量库，并记录回收的空间"""
+    if compaction_status["running"]:
+        return
+    compaction_status["running"] = True
+    started_at = datetime.now().isoformat()
+    try:
+        result = document_processor.compact()
+        result.update({"started_at": started_at, "finished_at": datetime.now().isoformat()})
+        print(f"向量库压缩完成，回收了 {result['reclaimed_bytes'] / 1024:.2f} KB")
+    except Exception as e:
+        print(f"压缩向量库时出错: {str(e)}")
+        result = {"started_at": started_at, "finished_at": datetime.now().isoformat(), "error": str(e)}
+    finally:
+        compaction_status["running"] = False
+    compaction_status["last_run"] = result
+
+@app.post("/maintenance/compact")
+async def schedule_compaction(background_tasks: BackgroundTasks):
+    """在后台重建向量库以回收空间"""
+    if compaction_status["running"]:
+        return {"scheduled": False, "status": compaction_status}
+    background_tasks.add_task(run_compaction)
+    return {"scheduled": True, "status": compaction_status}
+
+@app.get("/maintenance/compact")
+async def get_compaction_status():
+    """查看压缩任务状态和上次回收的空间"""
+    return compaction_status
+
+SNAPSHOTS_DIR = "./data/snapshots"
+
+def snapshot_path(name):
+    """把快照名解析为 ./data/snapshots 下的目录，只接受不含路径的名称"""
+    if not name or name in (".", "..") or os.path.basename(name) != name:
+        raise HTTPException(status_code=400, detail=f"无效的快照名称: {name}")
+    return os.path.join(SNAPSHOTS_DIR, name)
+
+def existing_snapshot_path(name):
+    path = snapshot_path(name)
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        raise HTTPException(status_code=404, detail=f"未找到快照: {name}")
+    return path
+
+@app.post("/snapshot/export")
+async def create_snapshot(
+    name: str = Form(None),
+    dtype: str = Form("float16"),
+    base: str = Form(None),
+    include_files: bool = Form(True),
+):
+    """导出知识库快照到 ./data/snapshots/<name>；指定 base（快照名）时只导出相对该快照的增量"""
+    name = name or datetime.now().strftime('%Y%m%d_%H%M%S')
+    snapshot_dir = snapshot_path(name)
+    base_dir = existing_snapshot_path(base) if base else None
+    try:
+        manifest = export_snapshot(document_processor, snapshot_dir, dtype=dtype, base_dir=base_dir,
+                                   extra_files=[layout_engine.cache_path], include_files=include_files)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导出快照时出错: {str(e)}")
+    return {"name": name, "path": snapshot_dir, "manifest": manifest}
+
+@app.get("/snapshot/diff")
+async def compare_snapshots(base: str, target: str):
+    """比较两个快照（按名称）之间新增、删除和变化的文本块"""
+    diff = diff_snapshots(existing_snapshot_path(base), existing_snapshot_path(target))
+    return {key: {"count": len(ids), "ids": ids} for key, ids in diff.items()}
+
 @app.get("/knowledge-graph")
-async def get_knowledge_graph():
-    """获取知识图谱数据"""
+async def get_knowledge_graph(
+    layout: str = Query("force", description="布局算法: force 或 hierarchical"),
+    detail: str = Query("full", description="细节层级: full 或 cluster"),
+    max_nodes: int = Query(500, description="cluster 模式下超过该节点数才聚合"),
+    x_min: float = None, y_min: float = None, x_max: float = None, y_max: float = None,
+):
+    """获取知识图谱数据（附带后端计算的节点坐标）"""
+    if layout not in ("force", "hierarchical"):
+        raise HTTPException(status_code=400, detail=f"不支持的布局算法: {layout}")
+    if detail not in ("full", "cluster"):
+        raise HTTPException(status_code=400, detail=f"不支持的细节层级: {detail}")
+    bbox = None
+    if None not in (x_min, y_min, x_max, y_max):
+        bbox = (x_min, y_min, x_max, y_max)
+
     try:
         uploads_dir = "./data/uploads"
         if not os.path.exists(uploads_dir):
@@ -110,46 +299,19 @@ async def get_knowledge_graph():
         # 调试信息
         print(f"找到了 {len(doc_paths)} 个文档")
         
-        # 尝试提取概念 - 简化版，确保每个文档至少有一个概念
-        links = []
+        # 从全局概念索引获取概念，未缓存的文档才调用 Claude 提取
         for path in doc_paths:
             try:
-                doc_name = os.path.basename(path)
-                
-                # 提取文档的关键概念
-                concepts_json = document_processor.extract_key_concepts(path)
-                
-                try:
-                    # 解析JSON
-                    concepts = json.loads(concepts_json)
-                    # 只处理字典形式的概念数据
-                    if isinstance(concepts, dict):
-                        # 为每个概念创建节点和关系
-                        for concept, description in list(concepts.items())[:3]:  # 只取前3个概念
-                            # 添加概念节点
-                            concept_id = f"{doc_name}_{concept}"
-                            nodes.append({
-                                "id": concept_id,
-                                "name": concept,
-                                "type": "concept",
-                                "document": doc_name,
-                                "size": 10
-                            })
-                            
-                            # 添加文档到概念的关系
-                            links.append({
-                                "source": doc_name,
-                                "target": concept_id,
-                                "type": "contains",
-                                "value": 0.7
-                            })
-                except Exception as e:
-                    print(f"解析文档 {doc_name} 的概念时出错: {str(e)}")
-                    continue
+                document_processor.index_concepts(path)
             except Exception as e:
-                print(f"处理文档 {path} 时出错: {str(e)}")
+                print(f"处理文档 {path} 的概念时出错: {str(e)}")
                 continue
         
+        # 同一规范概念被多个文档提及时，会连接到所有这些文档
+        concept_nodes, links = document_processor.concept_index.graph(
+            [os.path.basename(path) for path in doc_paths])
+        nodes.extend(concept_nodes)
+        
         # 如果有多个文档，尝试添加简单的文档间相似关系
         if len(doc_paths) > 1:
             try:
@@ -159,17 +321,39 @@ async def get_knowledge_graph():
                         "source": relation["source"],
                         "target": relation["target"],
                         "type": "similar",
-                        "value": relation["strength"]
+                        "value": relation["strength"],
+                        "evidence": relation["evidence"]
                     })
             except Exception as e:
                 print(f"计算文档相似度时出错: {str(e)}")
         
+        # 计算布局坐标，并按细节层级和视口裁剪
+        nodes, links = layout_engine.apply(nodes, links, layout=layout, detail=detail,
+                                           max_nodes=max_nodes, bbox=bbox)
+        
         # 返回结果，即使图谱可能很简单
-        return {"nodes": nodes, "links": links}
+        return {"nodes": nodes, "links": links, "layout": layout, "detail": detail}
     except Exception as e:
         print(f"生成知识图谱时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"生成知识图谱时出错: {str(e)}")
 
+@app.get("/concepts/{name}/documents")
+async def get_concept_documents(name: str):
+    """查询提及某个概念的所有文档"""
+    try:
+        concept = document_processor.concept_index.documents_for(name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询概念时出错: {str(e)}")
+    
+    if concept is None:
+        raise HTTPException(status_code=404, detail=f"未找到概念: {name}")
+    return {
+        "concept": concept["name"],
+        "description": concept["description"],
+        "aliases": concept["aliases"],
+        "documents": concept["documents"]
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""对比进程内量化向量索引与 Chroma 的 recall@k、查询延迟和内存占用
+
+用法:
+    python bench_vector_index.py                       # 合成数据
+    python bench_vector_index.py --n 100000 --dim 1536
+    python bench_vector_index.py --from-store          # 使用 ./data 下已存储的块向量
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from sharding import ShardRouter
+from vector_index import QuantizedVectorIndex
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB）"""
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+
+
+def synthetic_data(n, dim, clusters=64, seed=42):
+    """带聚类结构的合成向量，比纯随机向量更接近真实文本嵌入"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.5 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors, [f"doc_{label}" for label in labels]
+
+
+def stored_data(collection_name="personal_knowledge"):
+    """读取所有分片中已存储的块向量"""
+    import chromadb
+    vectors, file_paths = [], []
+    router = ShardRouter()
+    for shard in router.existing_shards():
+        client = chromadb.PersistentClient(path=router.persist_directory(shard))
+        collection = client.get_collection(collection_name)
+        page = collection.get(include=["embeddings", "metadatas"])
+        vectors.extend(page["embeddings"])
+        file_paths.extend(metadata.get("file_path", "") for metadata in page["metadatas"])
+    return np.asarray(vectors, dtype=np.float32), file_paths
+
+
+def recall_at_k(results, truth):
+    return float(np.mean([len(set(found) & set(expected)) / len(expected)
+                          for found, expected in zip(results, truth)]))
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = fn(queries)
+    return results, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--from-store", action="store_true")
+    args = parser.parse_args()
+
+    if args.from_store:
+        vectors, file_paths = stored_data()
+    else:
+        vectors, file_paths = synthetic_data(args.n, args.dim)
+    ids = [str(i) for i in range(len(vectors))]
+    print(f"向量数量: {len(vectors)}, 维度: {vectors.shape[1]}, k={args.k}")
+
+    rng = np.random.default_rng(0)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.1 * rng.normal(size=(len(picks), vectors.shape[1])).astype(np.float32)
+
+    # 真值：float32 精确检索
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    normalized_queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [[str(i) for i in row] for row in np.argsort(-(normalized_queries @ normalized.T), axis=1)[:, :args.k]]
+    del normalized
+
+    rows = []
+    workdir = tempfile.mkdtemp(prefix="bench_vector_index_")
+    try:
+        # Chroma（HNSW，余弦距离）
+        import chromadb
+        rss_before = current_rss_mb()
+        client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma"))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        for start in range(0, len(vectors), 5000):
+            collection.add(ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000].tolist())
+        rss_chroma = current_rss_mb() - rss_before
+
+        def chroma_search(qs):
+            return collection.query(query_embeddings=qs.tolist(), n_results=args.k, include=[])["ids"]
+        results, latency = timed(chroma_search, queries)
+        rows.append(("chroma hnsw", recall_at_k(results, truth), latency, rss_chroma))
+
+        # 进程内量化索引
+        for dtype in ("int8", "float16"):
+            rss_before = current_rss_mb()
+            index = QuantizedVectorIndex(os.path.join(workdir, dtype), dtype=dtype)
+            for start in range(0, len(vectors), 5000):
+                index.add(ids[start:start + 5000], vectors[start:start + 5000], file_paths[start])
+            rss_index = current_rss_mb() - rss_before
+
+            def flat_search(qs):
+                return [[chunk_id for chunk_id, _, _ in hits] for hits in index.search(qs, k=args.k)]
+            results, latency = timed(flat_search, queries)
+            rows.append((f"{dtype} flat", recall_at_k(results, truth), latency, rss_index))
+
+            index.train_ivf()
+
+            def ivf_search(qs):
+                return [[chunk_id for chunk_id, _, _ in hits]
+                        for hits in index.search(qs, k=args.k, nprobe=args.nprobe)]
+            results, latency = timed(ivf_search, queries)
+            rows.append((f"{dtype} ivf(nprobe={args.nprobe})", recall_at_k(results, truth), latency,
+                         current_rss_mb() - rss_before))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'索引':<24}{'recall@k':>10}{'延迟(ms/查询)':>16}{'RSS增量(MB)':>14}")
+    for name, recall, latency, rss in rows:
+        print(f"{name:<24}{recall:>10.3f}{latency:>16.2f}{rss:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
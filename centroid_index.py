@@ -0,0 +1,132 @@
+import numpy as np
+import os
+import json
+from typing import List, Dict
+
+
+class DocumentCentroidIndex:
+    """文档中心向量索引：每个文档用其块向量的归一化均值表示，用于两阶段检索的第一阶段"""
+
+    def __init__(self, store_dir="./data/centroid_index"):
+        self.store_dir = store_dir
+        self.file_paths: List[str] = []
+        self.position: Dict[str, int] = {}
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        # 文档级元数据（入库时写入），用于在路由阶段按过滤条件筛选候选文档
+        self.metadata: Dict[str, dict] = {}
+        self.load()
+
+    def __len__(self):
+        return len(self.file_paths)
+
+    def load(self):
+        """从磁盘加载中心向量"""
+        path = os.path.join(self.store_dir, "centroids.npz")
+        if not os.path.exists(path):
+            return
+        data = np.load(path)
+        self.file_paths = [str(p) for p in data["file_paths"]]
+        self.centroids = data["centroids"].astype(np.float32)
+        self.position = {p: i for i, p in enumerate(self.file_paths)}
+
+        metadata_path = os.path.join(self.store_dir, "metadata.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                self.metadata = json.load(f)
+
+    def save(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        np.savez(os.path.join(self.store_dir, "centroids.npz"),
+                 file_paths=np.array(self.file_paths), centroids=self.centroids)
+        with open(os.path.join(self.store_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, ensure_ascii=False)
+
+    @staticmethod
+    def _centroid(embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        centroid = vectors.mean(axis=0)
+        return centroid / max(np.linalg.norm(centroid), 1e-12)
+
+    def _set(self, file_path, centroid, metadata):
+        self.metadata[file_path] = metadata
+        if file_path in self.position:
+            self.centroids[self.position[file_path]] = centroid
+            return
+        self.position[file_path] = len(self.file_paths)
+        self.file_paths.append(file_path)
+        row = centroid[np.newaxis, :]
+        self.centroids = row if not self.centroids.size else np.vstack([self.centroids, row])
+
+    def update_document(self, collection, file_path, shard=None):
+        """文档入库后调用：用已存储的块向量计算该文档的中心向量，并记录文档实际所在的分片"""
+        own = collection.get(where={"file_path": file_path}, include=["embeddings", "metadatas"])
+        if own["ids"]:
+            metadata = dict(own["metadatas"][0])
+            if shard is not None:
+                metadata["shard"] = shard
+            self._set(file_path, self._centroid(own["embeddings"]), metadata)
+            self.save()
+
+    def rebuild(self, collections, page_size=5000):
+        """分页读取一个或多个集合，重建所有文档的中心向量（用于补建旧数据）
+
+        collections 为 {分片名: 集合} 时同时记录每个文档所在的分片。
+        """
+        if isinstance(collections, dict):
+            named = list(collections.items())
+        elif isinstance(collections, (list, tuple)):
+            named = [(None, collection) for collection in collections]
+        else:
+            named = [(None, collections)]
+        grouped: Dict[str, list] = {}
+        metadata_of: Dict[str, dict] = {}
+        for shard, collection in named:
+            offset = 0
+            while True:
+                page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                for embedding, metadata in zip(page["embeddings"], page["metadatas"]):
+                    grouped.setdefault(metadata.get("file_path", ""), []).append(embedding)
+                    if metadata.get("file_path", "") not in metadata_of:
+                        metadata = dict(metadata)
+                        if shard is not None:
+                            metadata["shard"] = shard
+                        metadata_of[metadata.get("file_path", "")] = metadata
+                offset += len(page["ids"])
+
+        self.file_paths, self.position, self.metadata = [], {}, {}
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        for file_path, embeddings in grouped.items():
+            self._set(file_path, self._centroid(embeddings), metadata_of[file_path])
+        self.save()
+
+    def remove_document(self, file_path):
+        """删除文档的中心向量和元数据"""
+        idx = self.position.get(file_path)
+        if idx is None:
+            return
+        self.file_paths.pop(idx)
+        self.centroids = np.delete(self.centroids, idx, axis=0)
+        self.metadata.pop(file_path, None)
+        self.position = {p: i for i, p in enumerate(self.file_paths)}
+        self.save()
+
+    def top_documents(self, query_embedding, top_m=3, candidates=None):
+        """返回与查询最相近的 top_m 个文档路径，可限定在候选文档集合内"""
+        if not self.file_paths:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(np.linalg.norm(query), 1e-12)
+        scores = self.centroids @ query
+        if candidates is not None:
+            mask = np.array([p in candidates for p in self.file_paths])
+            if not mask.any():
+                return []
+            scores = np.where(mask, scores, -np.inf)
+            top_m = min(top_m, int(mask.sum()))
+        top_m = min(top_m, len(scores))
+        best = np.argpartition(-scores, top_m - 1)[:top_m]
+        best = best[np.argsort(-scores[best])]
+        return [self.file_paths[i] for i in best]
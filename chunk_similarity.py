@@ -0,0 +1,191 @@
+import numpy as np
+from scipy import sparse
+import os
+import json
+from typing import List, Dict, Any, Optional
+
+
+class ChunkSimilarityIndex:
+    """块级跨文档相似度：对已存储的块向量做近似 top-k 近邻检索，聚合成稀疏的文档相似度矩阵"""
+
+    def __init__(self, store_dir="./data/chunk_similarity", top_k=5, min_score=0.8, max_evidence=3):
+        self.store_dir = store_dir
+        self.top_k = top_k                # 每个块检索的近邻数
+        self.min_score = min_score        # 块对的最低余弦相似度
+        self.max_evidence = max_evidence  # 每条文档边保留的支撑块对数量
+
+        self.doc_names: List[Optional[str]] = []
+        self.doc_index: Dict[str, int] = {}
+        # 已经用自身块向量计算过近邻的文档；只作为别的文档的近邻出现时只有列号，不算已索引
+        self.computed = set()
+        # (i, j) 且 i < j -> 权重
+        self.weights: Dict[tuple, float] = {}
+        # "i,j" -> 支撑块对列表
+        self.evidence: Dict[str, List[Dict[str, Any]]] = {}
+        self.load()
+
+    def load(self):
+        """从磁盘加载稀疏矩阵和证据"""
+        index_path = os.path.join(self.store_dir, "index.json")
+        matrix_path = os.path.join(self.store_dir, "weights.npz")
+        if not os.path.exists(index_path) or not os.path.exists(matrix_path):
+            return
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.doc_names = data["doc_names"]
+        # 已删除文档的位置为 None，保留下来以免打乱矩阵的行列编号
+        self.doc_index = {name: i for i, name in enumerate(self.doc_names) if name is not None}
+        self.evidence = data["evidence"]
+        self.computed = set(data.get("computed", []))
+
+        matrix = sparse.load_npz(matrix_path).tocoo()
+        self.weights = {(int(i), int(j)): float(w)
+                        for i, j, w in zip(matrix.row, matrix.col, matrix.data) if i < j}
+
+    def save(self):
+        """持久化：权重存为 scipy 稀疏矩阵，证据存为 JSON"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        sparse.save_npz(os.path.join(self.store_dir, "weights.npz"), self.matrix())
+        with open(os.path.join(self.store_dir, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"doc_names": self.doc_names, "evidence": self.evidence,
+                       "computed": sorted(self.computed)}, f, ensure_ascii=False)
+
+    def matrix(self):
+        """返回对称的 CSR 相似度矩阵，行列顺序与 doc_names 一致"""
+        n = len(self.doc_names)
+        if not self.weights:
+            return sparse.csr_matrix((n, n), dtype=np.float32)
+        rows, cols = zip(*self.weights.keys())
+        data = list(self.weights.values())
+        upper = sparse.coo_matrix((data, (rows, cols)), shape=(n, n), dtype=np.float32)
+        return (upper + upper.T).tocsr()
+
+    def _register(self, file_name):
+        if file_name not in self.doc_index:
+            self.doc_index[file_name] = len(self.doc_names)
+            self.doc_names.append(file_name)
+        return self.doc_index[file_name]
+
+    def is_indexed(self, file_name):
+        return file_name in self.computed
+
+    def update_document(self, collections, file_path, vector_index=None):
+        """文档入库后调用：用它的块向量查询其他文档的近邻块，更新对应的行和列
+
+        collections 为一个或多个 Chroma 集合（分片），在每个分片中分别检索后合并；
+        传入 vector_index（进程内量化索引）且其中已有该文档时，改用它做近邻检索。
+        """
+        if not isinstance(collections, (list, tuple)):
+            collections = [collections]
+        file_name = os.path.basename(file_path)
+        doc_id = self._register(file_name)
+        self.computed.add(file_name)
+
+        # 其他文档 -> 该文档中每个块的最佳匹配 (分数, 本文档块ID, 对方块ID)
+        best: Dict[str, Dict[str, tuple]] = {}
+
+        def record(chunk_id, other_id, other_name, score):
+            if score < self.min_score:
+                return
+            current = best.setdefault(other_name, {}).get(chunk_id)
+            if current is None or score > current[0]:
+                best[other_name][chunk_id] = (float(score), chunk_id, other_id)
+
+        own_ids, own_vectors = [], None
+        if vector_index is not None:
+            own_ids, own_vectors = vector_index.get_vectors(file_path)
+
+        if own_ids:
+            results = vector_index.search(own_vectors, k=self.top_k, exclude_file_path=file_path)
+            for chunk_id, neighbours in zip(own_ids, results):
+                for other_id, other_path, score in neighbours:
+                    record(chunk_id, other_id, os.path.basename(other_path), score)
+        else:
+            own = {"ids": [], "embeddings": []}
+            own_counts = []
+            for collection in collections:
+                found = collection.get(where={"file_path": file_path}, include=["embeddings"])
+                own_counts.append(len(found["ids"]))
+                own["ids"].extend(found["ids"])
+                own["embeddings"].extend(found["embeddings"])
+            if not own["ids"]:
+                self.save()
+                return
+
+            queries = np.asarray(own["embeddings"], dtype=np.float32)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            for collection, own_count in zip(collections, own_counts):
+                n_others = collection.count() - own_count
+                if n_others <= 0:
+                    continue
+
+                # Chroma 的 HNSW 索引做近似 top-k，排除文档自身的块
+                results = collection.query(
+                    query_embeddings=own["embeddings"],
+                    n_results=min(self.top_k, n_others),
+                    where={"file_path": {"$ne": file_path}},
+                    include=["embeddings", "metadatas"]
+                )
+
+                for q, chunk_id, ids, embeddings, metadatas in zip(
+                        queries, own["ids"], results["ids"], results["embeddings"], results["metadatas"]):
+                    if not ids:
+                        continue
+                    candidates = np.asarray(embeddings, dtype=np.float32)
+                    candidates /= np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+                    for other_id, score, metadata in zip(ids, candidates @ q, metadatas):
+                        record(chunk_id, other_id, metadata.get("file_name", ""), score)
+
+        # 先清掉该文档旧的边，再写入新的
+        for key in [key for key in self.weights if doc_id in key]:
+            del self.weights[key]
+            self.evidence.pop(f"{key[0]},{key[1]}", None)
+
+        for other_name, matches in best.items():
+            other_doc = self._register(other_name)
+            if other_doc == doc_id:
+                continue
+            pairs = sorted(matches.values(), reverse=True)[:self.max_evidence]
+            # 权重取最强的几个块对的平均分，一段高度相关的内容就足以建立连接
+            key = tuple(sorted((doc_id, other_doc)))
+            self.weights[key] = float(np.mean([score for score, _, _ in pairs]))
+            self.evidence[f"{key[0]},{key[1]}"] = [
+                {"source": file_name, "source_chunk": source_chunk,
+                 "target": other_name, "target_chunk": target_chunk, "score": score}
+                for score, source_chunk, target_chunk in pairs
+            ]
+
+        self.save()
+
+    def remove_document(self, file_name):
+        """删除文档的所有边和证据"""
+        self.computed.discard(file_name)
+        doc_id = self.doc_index.pop(file_name, None)
+        if doc_id is None:
+            return
+        for key in [key for key in self.weights if doc_id in key]:
+            del self.weights[key]
+            self.evidence.pop(f"{key[0]},{key[1]}", None)
+        self.doc_names[doc_id] = None
+        self.save()
+
+    def edges(self, file_names=None, threshold=0.0):
+        """返回文档间的相似边及其支撑块对，可限定在给定的文档集合内"""
+        allowed = None if file_names is None else {self.doc_index[name] for name in file_names
+                                                   if name in self.doc_index}
+        edges = []
+        for (i, j), weight in self.weights.items():
+            if weight < threshold:
+                continue
+            if allowed is not None and (i not in allowed or j not in allowed):
+                continue
+            edges.append({
+                "source": self.doc_names[i],
+                "target": self.doc_names[j],
+                "strength": weight,
+                "type": "similar",
+                "evidence": self.evidence.get(f"{i},{j}", [])
+            })
+        return edges
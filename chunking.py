@@ -0,0 +1,145 @@
+import re
+from typing import List, Optional
+from langchain_core.documents import Document
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken 不可用或无法加载编码表时退回估算
+    _ENCODING = None
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+_WORD = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+# 标题：Markdown 标题、"第X章/节"、"1.2 标题" 形式的编号标题
+# 编号标题至少要有两级（1.2、3.1.4），且标题里不能有句读标点，避免把 "1. Buy milk" 这样的列表项
+# 或 "2023 was ..." 这样的正文当作标题
+_HEADING = re.compile(
+    r"^(#{1,6}\s+\S.*"
+    r"|第[一二三四五六七八九十百千0-9]+[章节篇部分][^\n]{0,40}"
+    r"|\d+(\.\d+){1,3}\.?\s+\S[^\n。.!?！？，,；;：:]{0,40})$"
+)
+# 句子边界：中文句末标点，或英文句末标点后跟空白
+_SENTENCE_END = re.compile(r"(?<=[。！？；!?])|(?<=[.;])(?=\s)")
+
+
+def count_tokens(text):
+    """计算文本的 token 数；没有 tiktoken 时按 CJK 字符约 1 token、其他词约 1.3 token 估算，
+    很长的连续字符串（URL、编码数据等）按约 4 个字符 1 token 计"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    cjk = len(_CJK.findall(text))
+    others = sum(max(1.3, len(word) / 4) for word in _WORD.findall(_CJK.sub(" ", text)))
+    return cjk + int(others)
+
+
+class StructureAwareChunker:
+    """按结构切分文档：页 -> 标题/段落 -> 句子，块大小以 token 计，并为每个块记录页码和偏移"""
+
+    def __init__(self, max_tokens=400, overlap_tokens=50):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def _blocks(self, text):
+        """把一页文本切成 (起始偏移, 文本, 是否为标题) 的块序列"""
+        blocks = []
+        for match in re.finditer(r"[^\n]+(?:\n(?!\s*\n)[^\n]+)*", text):
+            paragraph = match.group(0)
+            start = match.start()
+            lines = paragraph.split("\n")
+            # 段落首行是标题时单独成块
+            if len(lines) > 1 and _HEADING.match(lines[0].strip()):
+                blocks.append((start, lines[0], True))
+                start += len(lines[0]) + 1
+                paragraph = "\n".join(lines[1:])
+                blocks.append((start, paragraph, False))
+            else:
+                blocks.append((start, paragraph, bool(_HEADING.match(paragraph.strip()))))
+        return blocks
+
+    def _units(self, start, text):
+        """把超长的块按句子切分，单个句子仍超长时按字符硬切
+
+        返回 (起始偏移, 文本, token 数)，每个单元只计算一次 token 数，后续的重叠和元数据直接复用
+        """
+        tokens = count_tokens(text)
+        if tokens <= self.max_tokens:
+            return [(start, text, tokens)]
+        units = []
+        offset = 0
+        for sentence in _SENTENCE_END.split(text):
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if tokens <= self.max_tokens:
+                units.append((start + offset, sentence, tokens))
+            else:
+                # 按 token 比例估算每段的字符数
+                step = max(int(len(sentence) * self.max_tokens / tokens), 1)
+                for i in range(0, len(sentence), step):
+                    piece = sentence[i:i + step]
+                    units.append((start + offset + i, piece, count_tokens(piece)))
+            offset += len(sentence)
+        return units
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        """切分加载器返回的文档（PDF 每页一个 Document），返回带元数据的块"""
+        chunks = []
+        doc_offset = 0
+        # 当前所在的章节标题，跨页延续
+        heading: Optional[str] = None
+        for page_index, document in enumerate(documents):
+            text = document.page_content
+            page = document.metadata.get("page", page_index)
+
+            current: List[tuple] = []
+            current_tokens = 0
+
+            def flush():
+                if not current:
+                    return
+                start = current[0][0]
+                end = current[-1][0] + len(current[-1][1])
+                content = text[start:end].strip()
+                if content:
+                    metadata = dict(document.metadata)
+                    metadata.update({
+                        "page": page,
+                        "start_offset": doc_offset + start,
+                        "end_offset": doc_offset + end,
+                        "page_start_offset": start,
+                        "section": heading or "",
+                        # 各单元 token 数之和，不再对整块重新编码
+                        "token_count": current_tokens,
+                    })
+                    chunks.append(Document(page_content=content, metadata=metadata))
+
+            for block_start, block, is_heading in self._blocks(text):
+                if is_heading:
+                    # 新标题开始新的块，不与上一节重叠
+                    flush()
+                    current, current_tokens = [], 0
+                    heading = block.strip().lstrip("#").strip()
+
+                for unit in self._units(block_start, block):
+                    tokens = unit[2]
+                    if current and current_tokens + tokens > self.max_tokens:
+                        flush()
+                        # 保留末尾若干单元作为重叠
+                        overlap, overlap_tokens = [], 0
+                        for item in reversed(current):
+                            item_tokens = item[2]
+                            if overlap_tokens + item_tokens > self.overlap_tokens:
+                                break
+                            overlap.insert(0, item)
+                            overlap_tokens += item_tokens
+                        if overlap_tokens + tokens > self.max_tokens:
+                            overlap, overlap_tokens = [], 0
+                        current, current_tokens = overlap, overlap_tokens
+                    current.append(unit)
+                    current_tokens += tokens
+
+            # 页尾结束当前块，块不跨页
+            flush()
+            doc_offset += len(text)
+        return chunks
@@ -0,0 +1,166 @@
+import numpy as np
+import os
+import json
+from typing import List, Dict, Any, Optional
+
+
+class ConceptIndex:
+    """全局概念索引：批量嵌入概念名称和解释，把近似重复的概念合并成规范概念，并维护 概念->文档 倒排表"""
+
+    def __init__(self, embeddings, store_dir="./data/concept_index", merge_threshold=0.9, batch_size=64):
+        self.embeddings = embeddings
+        self.store_dir = store_dir
+        self.merge_threshold = merge_threshold  # 余弦相似度高于该值的概念视为同一概念
+        self.batch_size = batch_size
+
+        # 概念缓存：文件名 -> {概念: 解释}，避免重复调用 Claude 提取概念
+        self.doc_concepts: Dict[str, Dict[str, str]] = {}
+        # 规范概念：{"id", "name", "description", "aliases", "documents"}
+        self.concepts: List[Dict[str, Any]] = []
+        # 每个规范概念的向量和（未归一化），用于增量更新中心向量
+        self.vector_sums: Optional[np.ndarray] = None
+        self.name_index: Dict[str, int] = {}
+        self.load()
+
+    @staticmethod
+    def _normalize_name(name):
+        return " ".join(str(name).lower().split())
+
+    def load(self):
+        """从磁盘加载索引"""
+        index_path = os.path.join(self.store_dir, "index.json")
+        vectors_path = os.path.join(self.store_dir, "vectors.npy")
+        if not os.path.exists(index_path):
+            return
+
+        with open(index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.doc_concepts = data["doc_concepts"]
+        self.concepts = data["concepts"]
+        if os.path.exists(vectors_path) and self.concepts:
+            self.vector_sums = np.load(vectors_path)
+        self._rebuild_name_index()
+
+    def save(self):
+        """持久化索引：元数据存为 JSON，向量存为 .npy"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        with open(os.path.join(self.store_dir, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({"doc_concepts": self.doc_concepts, "concepts": self.concepts}, f, ensure_ascii=False)
+        if self.vector_sums is not None:
+            np.save(os.path.join(self.store_dir, "vectors.npy"), self.vector_sums)
+
+    def _rebuild_name_index(self):
+        self.name_index = {}
+        for i, concept in enumerate(self.concepts):
+            for alias in concept["aliases"]:
+                self.name_index[self._normalize_name(alias)] = i
+
+    def has_document(self, file_name):
+        return file_name in self.doc_concepts
+
+    def _embed(self, texts):
+        """分批嵌入，返回归一化后的向量矩阵"""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self.embeddings.embed_documents(texts[start:start + self.batch_size]))
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def add_document(self, file_name, concepts: Dict[str, str]):
+        """把一个文档的概念加入索引，已存在的文档会先被移除再重新加入"""
+        if file_name in self.doc_concepts:
+            self.remove_document(file_name, save=False)
+
+        self.doc_concepts[file_name] = concepts
+        items = list(concepts.items())
+        if not items:
+            self.save()
+            return []
+
+        vectors = self._embed([f"{name}: {description}" for name, description in items])
+        canonical_ids = []
+        for (name, description), vector in zip(items, vectors):
+            idx = self.name_index.get(self._normalize_name(name))
+
+            # 名称不完全相同时，按与规范概念中心向量的余弦相似度合并
+            if idx is None and self.vector_sums is not None and len(self.vector_sums):
+                centroids = self.vector_sums / np.maximum(
+                    np.linalg.norm(self.vector_sums, axis=1, keepdims=True), 1e-12)
+                scores = centroids @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.merge_threshold:
+                    idx = best
+
+            if idx is None:
+                idx = len(self.concepts)
+                self.concepts.append({
+                    "id": f"concept_{idx}",
+                    "name": name,
+                    "description": description,
+                    "aliases": [],
+                    "documents": []
+                })
+                row = vector[np.newaxis, :]
+                self.vector_sums = row.copy() if self.vector_sums is None else np.vstack([self.vector_sums, row])
+            else:
+                self.vector_sums[idx] += vector
+
+            concept = self.concepts[idx]
+            if name not in concept["aliases"]:
+                concept["aliases"].append(name)
+                self.name_index[self._normalize_name(name)] = idx
+            if file_name not in concept["documents"]:
+                concept["documents"].append(file_name)
+            canonical_ids.append(concept["id"])
+
+        self.save()
+        return canonical_ids
+
+    def remove_document(self, file_name, save=True):
+        """从倒排表中移除文档；不再被任何文档提及的概念保留向量但不再出现在结果中"""
+        self.doc_concepts.pop(file_name, None)
+        for concept in self.concepts:
+            if file_name in concept["documents"]:
+                concept["documents"].remove(file_name)
+        if save:
+            self.save()
+
+    def documents_for(self, name):
+        """查询提及某个概念的所有文档：先按名称/别名精确匹配，再按语义最近的规范概念匹配"""
+        idx = self.name_index.get(self._normalize_name(name))
+        if idx is None and self.vector_sums is not None and len(self.vector_sums):
+            vector = self._embed([name])[0]
+            centroids = self.vector_sums / np.maximum(
+                np.linalg.norm(self.vector_sums, axis=1, keepdims=True), 1e-12)
+            scores = centroids @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.merge_threshold:
+                idx = best
+        if idx is None or not self.concepts[idx]["documents"]:
+            return None
+        return self.concepts[idx]
+
+    def graph(self, file_names=None):
+        """生成规范概念节点和 文档->概念 连接，同一概念被多个文档提及时自然形成跨文档连接"""
+        allowed = None if file_names is None else set(file_names)
+        nodes = []
+        links = []
+        for concept in self.concepts:
+            documents = [doc for doc in concept["documents"] if allowed is None or doc in allowed]
+            if not documents:
+                continue
+            nodes.append({
+                "id": concept["id"],
+                "name": concept["name"],
+                "type": "concept",
+                "documents": len(documents),
+                "size": 10 + min(len(documents), 10)
+            })
+            for doc in documents:
+                links.append({
+                    "source": doc,
+                    "target": concept["id"],
+                    "type": "contains",
+                    "value": 0.7
+                })
+        return nodes, links
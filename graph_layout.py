@@ -0,0 +1,225 @@
+import networkx as nx
+import numpy as np
+import os
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+# 分层布局中各类型节点所在的层
+LAYER_BY_TYPE = {"document": 0, "concept": 1}
+
+
+class GraphLayoutEngine:
+    """在后端计算知识图谱布局，缓存节点坐标，新节点围绕已有的稳定坐标增量放置"""
+
+    def __init__(self, cache_path="./data/graph_layout.json"):
+        self.cache_path = cache_path
+        # 布局算法 -> {节点ID: [x, y]}
+        self.positions: Dict[str, Dict[str, List[float]]] = {}
+
+        if os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    self.positions = json.load(f)
+            except Exception as e:
+                print(f"读取布局缓存时出错: {str(e)}")
+                self.positions = {}
+
+    def save(self):
+        """持久化布局缓存"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump(self.positions, f, ensure_ascii=False)
+
+    def remove_nodes(self, node_ids):
+        """从所有布局的缓存中删除节点"""
+        for positions in self.positions.values():
+            for node_id in node_ids:
+                positions.pop(node_id, None)
+        self.save()
+
+    def build_graph(self, nodes, links):
+        """根据节点和连接构建NetworkX图"""
+        G = nx.Graph()
+        for node in nodes:
+            G.add_node(node["id"], type=node.get("type", "concept"))
+        for link in links:
+            if link["source"] in G and link["target"] in G:
+                G.add_edge(link["source"], link["target"], weight=link.get("value", 0.5))
+        return G
+
+    def compute(self, nodes, links, layout="force"):
+        """计算所有节点坐标，返回 {节点ID: (x, y)}"""
+        G = self.build_graph(nodes, links)
+        cached = self.positions.get(layout, {})
+
+        if layout == "hierarchical":
+            pos = self._hierarchical_layout(G)
+        elif layout == "force":
+            pos = self._force_layout(G, cached)
+        else:
+            raise ValueError(f"不支持的布局算法: {layout}")
+
+        # 只保留当前仍存在的节点，坐标有变化时才写回缓存
+        new_cache = {n: [float(x), float(y)] for n, (x, y) in pos.items()}
+        if new_cache != cached:
+            self.positions[layout] = new_cache
+            self.save()
+        return {n: (x, y) for n, (x, y) in new_cache.items()}
+
+    def _force_layout(self, G, cached):
+        """力导向布局：已有节点保持不动，只对新节点及其邻居所在的子图迭代"""
+        known = {n: cached[n] for n in G.nodes() if n in cached}
+        new_nodes = [n for n in G.nodes() if n not in known]
+
+        if not new_nodes:
+            return known
+        if not known:
+            # 首次布局：对整个图计算一次
+            return nx.spring_layout(G, seed=42, weight="weight")
+
+        # 全图的理想节点间距，保证增量子图和整体尺度一致
+        k = 1 / np.sqrt(max(len(G), 1))
+        rng = np.random.default_rng(42)
+
+        # 新节点的初始位置：已放置邻居的重心附近，没有邻居则放在已有布局的外围
+        known_array = np.array(list(known.values()))
+        center = known_array.mean(axis=0)
+        radius = np.abs(known_array - center).max() if len(known_array) > 1 else 1.0
+        init = {}
+        for n in new_nodes:
+            placed = [known[m] for m in G.neighbors(n) if m in known]
+            if placed:
+                init[n] = np.mean(placed, axis=0) + rng.normal(scale=k, size=2)
+            else:
+                angle = rng.uniform(0, 2 * np.pi)
+                init[n] = center + (radius + k) * np.array([np.cos(angle), np.sin(angle)])
+
+        pos = dict(known)
+        anchored = set()
+        for component in nx.connected_components(G.subgraph(new_nodes)):
+            if any(m in known for n in component for m in G.neighbors(n)):
+                anchored |= component
+                continue
+            # 与已有节点都不相连的新分量（例如概念全部是新概念的新文档）：单独布局后整体放到外围，
+            # 让文档和它的概念聚在一起
+            comp_pos = nx.spring_layout(G.subgraph(component), k=k, scale=k * np.sqrt(len(component)),
+                                        seed=42, weight="weight")
+            comp_center = np.mean(list(comp_pos.values()), axis=0)
+            comp_radius = max(np.abs(p - comp_center).max() for p in comp_pos.values())
+            angle = rng.uniform(0, 2 * np.pi)
+            offset = center + (radius + comp_radius + k) * np.array([np.cos(angle), np.sin(angle)])
+            pos.update({n: p - comp_center + offset for n, p in comp_pos.items()})
+
+        if anchored:
+            # 子图 = 与已有节点相连的新节点 + 它们已放置的邻居（固定不动）
+            anchors = {m for n in anchored for m in G.neighbors(n) if m in known}
+            sub_pos = {n: known[n] for n in anchors}
+            sub_pos.update({n: init[n] for n in anchored})
+            sub_pos = nx.spring_layout(
+                G.subgraph(anchored | anchors), pos=sub_pos, fixed=list(anchors), k=k,
+                iterations=30, seed=42, weight="weight"
+            )
+            pos.update({n: sub_pos[n] for n in anchored})
+        return pos
+
+    def _hierarchical_layout(self, G):
+        """分层布局：文档在上层，概念在下层，下层按上层邻居的重心排序以减少交叉"""
+        layers: Dict[int, List[str]] = {}
+        for n, data in G.nodes(data=True):
+            layer = LAYER_BY_TYPE.get(data.get("type"), max(LAYER_BY_TYPE.values()) + 1)
+            layers.setdefault(layer, []).append(n)
+
+        pos = {}
+        for depth, layer in enumerate(sorted(layers)):
+            members = layers[layer]
+            if depth == 0:
+                # 顶层按连通分量聚在一起
+                component_of = {}
+                for i, comp in enumerate(nx.connected_components(G)):
+                    for n in comp:
+                        component_of[n] = i
+                order = sorted(members, key=lambda n: (component_of[n], str(n)))
+            else:
+                # 重心法：按已放置邻居的平均横坐标排序
+                def barycenter(n):
+                    xs = [pos[m][0] for m in G.neighbors(n) if m in pos]
+                    return (np.mean(xs) if xs else float("inf"), str(n))
+                order = sorted(members, key=barycenter)
+
+            count = len(order)
+            for i, n in enumerate(order):
+                x = (i - (count - 1) / 2) / max(count - 1, 1) * 2
+                pos[n] = (x, -float(depth))
+        return pos
+
+    def cluster_summary(self, nodes, links, positions, max_nodes=500):
+        """细节层级：节点过多时把社区聚合成摘要节点，连接按社区合并"""
+        if len(nodes) <= max_nodes:
+            return nodes, links
+
+        G = self.build_graph(nodes, links)
+        communities = nx.community.louvain_communities(G, weight="weight", seed=42)
+        names = {node["id"]: node.get("name", node["id"]) for node in nodes}
+
+        cluster_of = {}
+        summary_nodes = []
+        for i, members in enumerate(sorted(communities, key=len, reverse=True)):
+            cluster_id = f"cluster_{i}"
+            for n in members:
+                cluster_of[n] = cluster_id
+            # 以度数最高的文档节点命名，没有文档则用度数最高的节点
+            documents = [n for n in members if G.nodes[n].get("type") == "document"]
+            label_node = max(documents or members, key=lambda n: (G.degree(n), str(n)))
+            xy = np.mean([positions[n] for n in members], axis=0)
+            summary_nodes.append({
+                "id": cluster_id,
+                "name": f"{names[label_node]} (+{len(members) - 1})",
+                "type": "cluster",
+                "size": 10 + int(np.log2(len(members)) * 5),
+                "members": len(members),
+                "documents": len(documents),
+                "x": float(xy[0]),
+                "y": float(xy[1]),
+            })
+
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for link in links:
+            source = cluster_of.get(link["source"])
+            target = cluster_of.get(link["target"])
+            if source is None or target is None or source == target:
+                continue
+            key = tuple(sorted((source, target)))
+            entry = merged.setdefault(key, {"source": key[0], "target": key[1],
+                                            "type": "aggregate", "value": 0.0, "count": 0})
+            entry["value"] += link.get("value", 0.5)
+            entry["count"] += 1
+
+        summary_links = []
+        for entry in merged.values():
+            entry["value"] = entry["value"] / entry["count"]
+            summary_links.append(entry)
+        return summary_nodes, summary_links
+
+    def crop(self, nodes, links, bbox: Optional[Tuple[float, float, float, float]]):
+        """只保留视口 (x_min, y_min, x_max, y_max) 内的节点及其之间的连接"""
+        if bbox is None:
+            return nodes, links
+        x_min, y_min, x_max, y_max = bbox
+        visible = [node for node in nodes
+                   if x_min <= node["x"] <= x_max and y_min <= node["y"] <= y_max]
+        ids = {node["id"] for node in visible}
+        return visible, [link for link in links
+                         if link["source"] in ids and link["target"] in ids]
+
+    def apply(self, nodes, links, layout="force", detail="full", max_nodes=500, bbox=None):
+        """为图谱数据附加坐标，并按细节层级和视口裁剪"""
+        positions = self.compute(nodes, links, layout)
+        for node in nodes:
+            node["x"], node["y"] = positions[node["id"]]
+
+        if detail == "cluster":
+            nodes, links = self.cluster_summary(nodes, links, positions, max_nodes)
+        elif detail != "full":
+            raise ValueError(f"不支持的细节层级: {detail}")
+
+        return self.crop(nodes, links, bbox)
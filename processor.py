@@ -1,82 +1,478 @@
 from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from anthropic import Anthropic
 import os
 from typing import List, Dict, Any
 import json
+import time
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from chunking import StructureAwareChunker
+from chunk_similarity import ChunkSimilarityIndex
+from concept_index import ConceptIndex
+from centroid_index import DocumentCentroidIndex
+from sharding import ShardRouter, fan_out
+from vector_index import QuantizedVectorIndex
+
+def load_document(file_path):
+    """加载不同类型的文档"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    
+    if file_extension == '.txt':
+        loader = TextLoader(file_path)
+    elif file_extension == '.pdf':
+        loader = PyPDFLoader(file_path)
+    elif file_extension in ['.docx', '.doc']:
+        loader = Docx2txtLoader(file_path)
+    else:
+        raise ValueError(f"不支持的文件类型: {file_extension}")
+        
+    documents = loader.load()
+    return documents
+
+def load_and_chunk(file_path, max_tokens=400, overlap_tokens=50):
+    """加载并切分单个文档（进程池中的工作函数）"""
+    chunker = StructureAwareChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    return chunker.split_documents(load_document(file_path))
 
 class DocumentProcessor:
-    def __init__(self, api_key, openai_api_key=None, collection_name="personal_knowledge"):
+    def __init__(self, api_key, openai_api_key=None, collection_name="personal_knowledge", num_shards=1,
+                 vector_index_dtype=None):
         self.client = Anthropic(api_key=api_key)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=100
-        )
+        # 按页/标题/段落/句子切分，块大小以 token 计
+        self.chunker = StructureAwareChunker(max_tokens=400, overlap_tokens=50)
         # 在实际项目中你可能需要替换为不同的嵌入模型
         self.embeddings = OpenAIEmbeddings(api_key=openai_api_key)
         self.collection_name = collection_name
         self.db_path = "./data/chroma_db"
+        # 各个索引共用一把锁；每个分片另有自己的锁，分片之间可以独立写入
+        self._lock = threading.RLock()
+        self._shard_locks: Dict[str, threading.RLock] = {}
+        
+        # 分片：按笔记本或文档哈希分区，单分片时就是原来的向量库
+        self.router = ShardRouter(num_shards=num_shards, default_path=self.db_path)
+        self.shards: Dict[str, Chroma] = {}
         
         # 如果已有向量库，则加载
-        if os.path.exists(self.db_path):
-            self.vectordb = Chroma(
-                persist_directory=self.db_path,
-                embedding_function=self.embeddings,
-                collection_name=self.collection_name
-            )
-        else:
-            self.vectordb = None
+        for shard in self.router.existing_shards():
+            self.shards[shard] = self._open_shard(shard)
+        self.backfill_metadata()
+        
+        # 块级跨文档相似度（稀疏矩阵，入库时增量更新）
+        self.chunk_similarity = ChunkSimilarityIndex()
+        
+        # 全局概念索引（概念缓存 + 规范概念 + 倒排表）
+        self.concept_index = ConceptIndex(self.embeddings)
+        
+        # 文档中心向量索引（两阶段检索的文档路由）
+        self.centroid_index = DocumentCentroidIndex()
+        # 首次两阶段检索时检查一次：启用中心向量索引之前入库的文档需要补建
+        self._centroids_checked = False
+        
+        # 可选的进程内量化向量索引（int8/float16，内存映射），供相似度和批处理任务使用
+        self.vector_index = None
+        if vector_index_dtype:
+            self.vector_index = QuantizedVectorIndex(dtype=vector_index_dtype)
+            # 补上未启用索引时入库的块，并去掉向量库中已不存在的块
+            self.sync_vector_index()
+    
+    def _open_shard(self, shard):
+        return Chroma(
+            persist_directory=self.router.persist_directory(shard),
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name
+        )
+    
+    def _shard_lock(self, shard):
+        with self._lock:
+            return self._shard_locks.setdefault(shard, threading.RLock())
+    
+    def _collections(self):
+        return [vectordb._collection for vectordb in list(self.shards.values())]
+    
+    def backfill_metadata(self, page_size=5000):
+        """为加入过滤条件之前入库的块补上 file_ext、original_name 和 uploaded_at
+
+        file_ext 和 original_name 由 file_path 推出；uploaded_at 取上传文件的修改时间，
+        文件已不存在时无法推断，这些块不会出现在带日期条件的检索结果中。
+        """
+        for shard in list(self.shards):
+            with self._shard_lock(shard):
+                collection = self.shards[shard]._collection
+                offset, updated = 0, False
+                while True:
+                    page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    offset += len(page["ids"])
+                    ids, metadatas = [], []
+                    for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                        if all(key in metadata for key in ("file_ext", "original_name", "uploaded_at")):
+                            continue
+                        file_path = metadata.get("file_path", "")
+                        filled = dict(metadata)
+                        filled.setdefault("file_ext", os.path.splitext(file_path)[1].lower())
+                        filled.setdefault("original_name", metadata.get("file_name") or os.path.basename(file_path))
+                        if "uploaded_at" not in filled and os.path.exists(file_path):
+                            filled["uploaded_at"] = int(os.path.getmtime(file_path))
+                        if filled != metadata:
+                            ids.append(chunk_id)
+                            metadatas.append(filled)
+                    if ids:
+                        collection.update(ids=ids, metadatas=metadatas)
+                        updated = True
+                if updated:
+                    self.shards[shard].persist()
+    
+    def sync_vector_index(self, page_size=5000):
+        """对比各分片中已存储的块ID和进程内量化索引：只读取并补入索引中缺少的块向量，
+        删除索引中多出的块"""
+        stored = set()
+        for collection in self._collections():
+            offset = 0
+            while True:
+                page = collection.get(include=[], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+                stored.update(page["ids"])
+                missing = [chunk_id for chunk_id in page["ids"] if chunk_id not in self.vector_index.row_of]
+                if not missing:
+                    continue
+                page = collection.get(ids=missing, include=["embeddings", "metadatas"])
+                by_file: Dict[str, List[int]] = {}
+                for i, metadata in enumerate(page["metadatas"]):
+                    by_file.setdefault(metadata.get("file_path", ""), []).append(i)
+                for file_path, rows in by_file.items():
+                    self.vector_index.add([page["ids"][i] for i in rows],
+                                          [page["embeddings"][i] for i in rows], file_path)
+        stale = set(self.vector_index.row_of) - stored
+        if stale:
+            self.vector_index.remove_ids(stale)
+    
+    def ensure_centroids(self, page_size=5000):
+        """向量库中有文档缺少中心向量、或记录的分片与实际所在分片不一致时（例如升级前入库的文档、
+        调整分片数量或从快照恢复之后），重建中心向量索引"""
+        if self._centroids_checked:
+            return
+        with self._lock:
+            if self._centroids_checked:
+                return
+            stored = {}
+            for shard, vectordb in list(self.shards.items()):
+                offset = 0
+                while True:
+                    page = vectordb._collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                    if not page["ids"]:
+                        break
+                    offset += len(page["ids"])
+                    for metadata in page["metadatas"]:
+                        stored[metadata.get("file_path", "")] = shard
+            # 中心向量的元数据也要包含补齐后的过滤字段
+            metadata = self.centroid_index.metadata
+            if any(metadata.get(path, {}).get("shard") != shard or "file_ext" not in metadata.get(path, {})
+                   for path, shard in stored.items()):
+                self.centroid_index.rebuild({shard: vectordb._collection
+                                             for shard, vectordb in list(self.shards.items())})
+            self._centroids_checked = True
     
     def load_document(self, file_path):
         """加载不同类型的文档"""
-        file_extension = os.path.splitext(file_path)[1].lower()
-        
-        if file_extension == '.txt':
-            loader = TextLoader(file_path)
-        elif file_extension == '.pdf':
-            loader = PyPDFLoader(file_path)
-        elif file_extension in ['.docx', '.doc']:
-            loader = Docx2txtLoader(file_path)
-        else:
-            raise ValueError(f"不支持的文件类型: {file_extension}")
-            
-        documents = loader.load()
-        return documents
+        return load_document(file_path)
     
-    def process_document(self, file_path):
-        """处理文档并添加到向量库"""
+    def process_document(self, file_path, original_name=None, notebook=None):
+        """处理文档并添加到所属分片的向量库"""
         documents = self.load_document(file_path)
-        chunks = self.text_splitter.split_documents(documents)
-        
-        # 对每个chunk添加元数据
+        chunks = self.chunker.split_documents(documents)
+        return self._store_chunks(file_path, chunks, original_name, notebook)
+    
+    def process_documents(self, file_paths, original_names=None, notebook=None, max_workers=None):
+        """批量处理文档：在进程池中并行加载和切分，再依次写入向量库，返回每个文档的块数"""
+        original_names = original_names or [None] * len(file_paths)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            all_chunks = list(executor.map(
+                load_and_chunk, file_paths,
+                [self.chunker.max_tokens] * len(file_paths),
+                [self.chunker.overlap_tokens] * len(file_paths)
+            ))
+        return [self._store_chunks(path, chunks, name, notebook)
+                for path, chunks, name in zip(file_paths, all_chunks, original_names)]
+    
+    def _store_chunks(self, file_path, chunks, original_name=None, notebook=None):
+        """为块添加元数据并写入所属分片，同时更新各个索引"""
+        # 对每个chunk添加元数据，这些字段可在检索时作为过滤条件
+        uploaded_at = int(time.time())
         for chunk in chunks:
             chunk.metadata["file_name"] = os.path.basename(file_path)
             chunk.metadata["file_path"] = file_path
+            chunk.metadata["original_name"] = original_name or os.path.basename(file_path)
+            chunk.metadata["file_ext"] = os.path.splitext(file_path)[1].lower()
+            chunk.metadata["uploaded_at"] = uploaded_at
+            chunk.metadata["notebook"] = notebook or ""
+        
+        shard = self.router.shard_for(file_path, notebook)
+        with self._shard_lock(shard):
+            # 初始化或更新分片的向量库
+            if shard not in self.shards:
+                self.shards[shard] = Chroma.from_documents(
+                    documents=chunks,
+                    embedding=self.embeddings,
+                    persist_directory=self.router.persist_directory(shard),
+                    collection_name=self.collection_name
+                )
+            else:
+                self.shards[shard].add_documents(chunks)
+                
+            self.shards[shard].persist()
         
-        # 初始化或更新向量库
-        if self.vectordb is None:
-            self.vectordb = Chroma.from_documents(
-                documents=chunks,
-                embedding=self.embeddings,
-                persist_directory=self.db_path,
-                collection_name=self.collection_name
-            )
-        else:
-            self.vectordb.add_documents(chunks)
+        # 压缩会同时持有 self._lock 和分片锁，拿到 self._lock 后分片客户端不会再被替换
+        with self._lock:
+            collection = self.shards[shard]._collection
+            if self.vector_index is not None:
+                stored = collection.get(where={"file_path": file_path}, include=["embeddings"])
+                self.vector_index.add(stored["ids"], stored["embeddings"], file_path)
             
-        self.vectordb.persist()
+            # 用已存储的块向量增量更新文档相似度，无需重新调用嵌入接口
+            self.chunk_similarity.update_document(self._collections(), file_path, self.vector_index)
+            self.centroid_index.update_document(collection, file_path, shard)
         return len(chunks)
     
-    def search(self, query, top_k=5):
-        """搜索相关文档"""
-        if self.vectordb is None:
-            return []
+    def delete_document(self, file_path):
+        """删除文档：向量库中的块、概念缓存、中心向量、相似度边以及存储的文件"""
+        file_name = os.path.basename(file_path)
+        with self._lock:
+            removed_chunks = 0
+            # 先拿分片锁再读取分片对象：后台压缩会在持有分片锁时替换 self.shards 中的客户端
+            for shard in list(self.shards):
+                with self._shard_lock(shard):
+                    vectordb = self.shards.get(shard)
+                    if vectordb is None:
+                        continue
+                    collection = vectordb._collection
+                    found = len(collection.get(where={"file_path": file_path}, include=[])["ids"])
+                    if found:
+                        collection.delete(where={"file_path": file_path})
+                        vectordb.persist()
+                        removed_chunks += found
+            
+            self.chunk_similarity.remove_document(file_name)
+            self.centroid_index.remove_document(file_path)
+            self.concept_index.remove_document(file_name)
+            if self.vector_index is not None:
+                self.vector_index.remove_document(file_path)
             
-        results = self.vectordb.similarity_search(query, k=top_k)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        return removed_chunks
+    
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+    
+    def compact(self, page_size=5000):
+        """逐个重建持久化的分片以回收删除后残留的空间，返回压缩前后的字节数"""
+        report = {"bytes_before": 0, "bytes_after": 0, "reclaimed_bytes": 0, "shards": {}}
+        for shard in list(self.shards):
+            # 替换分片目录期间不能有其他线程使用该分片的客户端：各个索引通过 self._lock 读取所有分片，
+            # 写入和检索通过分片锁访问单个分片，所以两把锁都要持有（顺序与删除文档一致）
+            with self._lock, self._shard_lock(shard):
+                result = self._compact_shard(shard, page_size)
+            report["shards"][shard] = result
+            for key in ("bytes_before", "bytes_after", "reclaimed_bytes"):
+                report[key] += result[key]
+        
+        if self.vector_index is not None:
+            with self._lock:
+                self.vector_index.rebuild()
+        return report
+    
+    def _compact_shard(self, shard, page_size):
+        db_path = self.router.persist_directory(shard)
+        bytes_before = self._dir_size(db_path)
+        compact_path = db_path + ".compact"
+        if os.path.exists(compact_path):
+            shutil.rmtree(compact_path)
+        
+        # 分页把现有的块（含向量，不重新调用嵌入接口）复制到新的目录
+        collection = self.shards[shard]._collection
+        target = Chroma(
+            persist_directory=compact_path,
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name,
+            collection_metadata=collection.metadata
+        )
+        offset = 0
+        while True:
+            page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                  limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            target._collection.add(ids=page["ids"], embeddings=page["embeddings"],
+                                   documents=page["documents"], metadatas=page["metadatas"])
+            offset += len(page["ids"])
+        target.persist()
+        
+        # 释放两个目录的客户端缓存后替换目录，再重新打开；分片在 self.shards 中始终存在
+        del target
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except (ImportError, AttributeError):
+            pass
+        
+        try:
+            shutil.rmtree(db_path)
+            os.rename(compact_path, db_path)
+        finally:
+            # 无论替换是否成功都重新打开，避免分片从 self.shards 中消失
+            self.shards[shard] = self._open_shard(shard)
+        
+        bytes_after = self._dir_size(db_path)
+        return {
+            "bytes_before": bytes_before,
+            "bytes_after": bytes_after,
+            "reclaimed_bytes": bytes_before - bytes_after
+        }
+    
+    def build_where(self, filters):
+        """把结构化过滤条件转换为 Chroma 的 where 子句
+        
+        支持的键: file_names（存储名或原始文件名）、extensions、date_from / date_to（Unix 时间戳）、
+        concepts（通过概念索引的倒排表解析为文档）。概念没有匹配任何文档时返回 None 表示结果为空。
+        旧数据的这些字段由 backfill_metadata 补齐；上传文件已不存在的旧块没有 uploaded_at，不会匹配日期条件。
+        """
+        if not filters:
+            return {}
+        
+        conditions = []
+        if filters.get("file_names"):
+            names = list(filters["file_names"])
+            conditions.append({"$or": [{"file_name": {"$in": names}},
+                                       {"original_name": {"$in": names}}]})
+        if filters.get("extensions"):
+            extensions = [ext.lower() if ext.startswith(".") else f".{ext.lower()}"
+                          for ext in filters["extensions"]]
+            conditions.append({"file_ext": {"$in": extensions}})
+        if filters.get("date_from") is not None:
+            conditions.append({"uploaded_at": {"$gte": int(filters["date_from"])}})
+        if filters.get("date_to") is not None:
+            conditions.append({"uploaded_at": {"$lte": int(filters["date_to"])}})
+        if filters.get("concepts"):
+            file_names = set()
+            for tag in filters["concepts"]:
+                concept = self.concept_index.documents_for(tag)
+                if concept is not None:
+                    file_names.update(concept["documents"])
+            if not file_names:
+                return None
+            conditions.append({"file_name": {"$in": sorted(file_names)}})
+        
+        if not conditions:
+            return {}
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"$and": conditions}
+    
+    def _match_metadata(self, metadata, where):
+        """在内存中按 where 子句匹配文档级元数据（两阶段检索的文档路由使用）"""
+        for key, condition in where.items():
+            if key == "$and":
+                if not all(self._match_metadata(metadata, c) for c in condition):
+                    return False
+            elif key == "$or":
+                if not any(self._match_metadata(metadata, c) for c in condition):
+                    return False
+            else:
+                value = metadata.get(key)
+                for op, expected in condition.items():
+                    if value is None:
+                        return False
+                    if op == "$in" and value not in expected:
+                        return False
+                    if op == "$gte" and value < expected:
+                        return False
+                    if op == "$lte" and value > expected:
+                        return False
+        return True
+    
+    def search(self, query, top_k=5, two_stage=False, top_m=3, per_doc_cap=None, filters=None,
+               notebook=None):
+        """搜索相关文档（见 search_with_stats）"""
+        results, _ = self.search_with_stats(query, top_k, two_stage, top_m, per_doc_cap, filters, notebook)
         return results
     
+    def search_with_stats(self, query, top_k=5, two_stage=False, top_m=3, per_doc_cap=None,
+                          filters=None, notebook=None):
+        """搜索相关文档，并返回每个分片的检索耗时
+        
+        two_stage=True 时先用文档中心向量选出 top_m 个文档，再只在这些文档的块中检索；
+        per_doc_cap 限制每个文档最多返回的块数，避免单个文档占满结果；
+        filters 为结构化过滤条件（见 build_where），直接下推到向量库的 where 子句；
+        notebook 指定时只检索该笔记本的分片，否则并发查询所有分片后合并 top-k。
+        """
+        shards = list(self.shards)
+        if notebook:
+            shard = self.router.notebook_shard(notebook)
+            shards = [shard] if shard in shards else []
+        if not shards:
+            return [], {}
+        
+        where = self.build_where(filters)
+        if where is None:
+            return [], {}
+        
+        # 有单文档上限时多取一些候选，截断后仍能凑够 top_k
+        fetch_k = top_k * 3 if per_doc_cap else top_k
+        query_embedding = self.embeddings.embed_query(query)
+        
+        if two_stage:
+            self.ensure_centroids()
+            candidates = None
+            if where or notebook:
+                candidates = {path for path, metadata in self.centroid_index.metadata.items()
+                              if self._match_metadata(metadata, where)
+                              and (not notebook or metadata.get("notebook") == notebook)}
+            file_paths = self.centroid_index.top_documents(query_embedding, top_m, candidates)
+            if not file_paths:
+                return [], {}
+            route = {"file_path": {"$in": file_paths}}
+            where = {"$and": [where, route]} if where else route
+            # 只查询包含这些文档的分片：使用入库时记录的实际分片，而不是按当前分片配置重新计算
+            routed = {self.centroid_index.metadata.get(path, {}).get("shard") for path in file_paths}
+            if None not in routed:
+                shards = [name for name in shards if name in routed]
+        
+        def search_shard(shard):
+            # 在分片锁内读取客户端，避免查询到正在压缩、目录已被替换的分片
+            with self._shard_lock(shard):
+                return self.shards[shard].similarity_search_by_vector_with_relevance_scores(
+                    query_embedding, k=fetch_k, filter=where or None
+                )
+        
+        per_shard, latency_ms = fan_out({shard: shard for shard in shards}, search_shard)
+        
+        # 合并各分片的 top-k：Chroma 返回的是距离，越小越相近
+        merged = sorted((pair for pairs in per_shard.values() for pair in pairs), key=lambda pair: pair[1])
+        results = [doc for doc, _ in merged]
+        
+        if per_doc_cap:
+            counts = {}
+            capped = []
+            for doc in results:
+                path = doc.metadata.get("file_path", "")
+                counts[path] = counts.get(path, 0) + 1
+                if counts[path] <= per_doc_cap:
+                    capped.append(doc)
+            results = capped
+        
+        return results[:top_k], latency_ms
+    
     def generate_answer(self, query, context_docs):
         """生成回答"""
         context = "\n\n".join([doc.page_content for doc in context_docs])
@@ -179,6 +575,23 @@ class DocumentProcessor:
         concepts_text = response.content[0].text
         return concepts_text  # 返回原始文本，后续解析时再处理
 
+    def index_concepts(self, file_path, concepts_text=None):
+        """把文档的关键概念加入全局概念索引，已缓存的文档不会再次调用 Claude"""
+        file_name = os.path.basename(file_path)
+        if concepts_text is None:
+            if self.concept_index.has_document(file_name):
+                return self.concept_index.doc_concepts[file_name]
+            concepts_text = self.extract_key_concepts(file_path)
+        
+        concepts = self.parse_concepts_json(concepts_text)
+        # 只处理字典形式的概念数据，忽略解析失败时的占位结构
+        if not isinstance(concepts, dict) or "未能解析" in concepts:
+            concepts = {}
+        concepts = {str(name): str(description) for name, description in concepts.items()}
+        
+        self.concept_index.add_document(file_name, concepts)
+        return concepts
+
     def extract_knowledge_relations(self, documents):
         """提取文档之间的知识关联"""
         # 获取所有文档的摘要和关键概念
@@ -245,58 +658,23 @@ class DocumentProcessor:
                 
         return relations
 
-    def calculate_document_similarity(self, doc_paths):
-        """计算文档间的相似度"""
-        similarities = []
+    def calculate_document_similarity(self, doc_paths, threshold=0.5):
+        """计算文档间的相似度（基于块级近邻匹配）"""
+        if not self.shards:
+            return []
         
-        # 为每个文档生成嵌入向量
-        doc_embeddings = {}
+        collections = self._collections()
+        file_names = []
         for path in doc_paths:
             if not os.path.exists(path):
                 continue
             
             file_name = os.path.basename(path)
-            docs = self.load_document(path)
-            full_text = " ".join([doc.page_content for doc in docs])
-            
-            # 获取文档的嵌入向量
-            embedding = self.vectordb._embedding_function.embed_documents([full_text])[0]
-            doc_embeddings[file_name] = embedding
-        
-        # 计算文档间的相似度 - 避免导入问题的方法
-        import numpy as np
-        
-        # 手动实现余弦相似度计算
-        def cosine_sim(v1, v2):
-            # 转为numpy数组
-            v1_np = np.array(v1)
-            v2_np = np.array(v2)
+            file_names.append(file_name)
             
-            # 计算余弦相似度
-            dot_product = np.dot(v1_np, v2_np)
-            norm_v1 = np.linalg.norm(v1_np)
-            norm_v2 = np.linalg.norm(v2_np)
-            
-            # 避免除零错误
-            if norm_v1 == 0 or norm_v2 == 0:
-                return 0.0
-            
-            return dot_product / (norm_v1 * norm_v2)
+            # 在启用块级索引之前入库的文档，用已存储的向量补建索引
+            if not self.chunk_similarity.is_indexed(file_name):
+                self.chunk_similarity.update_document(collections, path, self.vector_index)
         
-        doc_names = list(doc_embeddings.keys())
-        for i in range(len(doc_names)):
-            for j in range(i+1, len(doc_names)):
-                name1, name2 = doc_names[i], doc_names[j]
-                vec1, vec2 = doc_embeddings[name1], doc_embeddings[name2]
-                
-                sim_score = float(cosine_sim(vec1, vec2))
-                
-                if sim_score > 0.5:  # 只保留相似度较高的关系
-                    similarities.append({
-                        "source": name1,
-                        "target": name2,
-                        "strength": sim_score,
-                        "type": "similar"
-                    })
-        
-        return similarities
\ No newline at end of file
+        # 只保留相似度较高的关系，每条边附带支撑的块对
+        return self.chunk_similarity.edges(file_names, threshold=threshold)
@@ -0,0 +1,66 @@
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+DEFAULT_SHARD = "default"
+
+
+class ShardRouter:
+    """把文档分配到分片：按笔记本（租户）分区，或按文档哈希分散到固定数量的分片"""
+
+    def __init__(self, num_shards=1, default_path="./data/chroma_db", shards_dir="./data/shards"):
+        self.num_shards = max(int(num_shards), 1)
+        # 单分片时沿用原来的向量库目录，兼容已有数据
+        self.default_path = default_path
+        self.shards_dir = shards_dir
+
+    def shard_for(self, file_path, notebook=None):
+        """返回文档所属的分片名"""
+        if notebook:
+            return self.notebook_shard(notebook)
+        if self.num_shards == 1:
+            return DEFAULT_SHARD
+        digest = hashlib.md5(os.path.basename(file_path).encode("utf-8")).hexdigest()
+        return f"shard_{int(digest, 16) % self.num_shards}"
+
+    @staticmethod
+    def notebook_shard(notebook):
+        """笔记本对应的分片名，只保留安全的字符作为目录名"""
+        return "notebook_" + re.sub(r"[^0-9A-Za-z_\-]", "_", notebook)
+
+    def persist_directory(self, shard):
+        if shard == DEFAULT_SHARD:
+            return self.default_path
+        return os.path.join(self.shards_dir, shard)
+
+    def existing_shards(self):
+        """列出磁盘上已有的分片"""
+        shards = []
+        if os.path.exists(self.default_path):
+            shards.append(DEFAULT_SHARD)
+        if os.path.exists(self.shards_dir):
+            shards.extend(sorted(name for name in os.listdir(self.shards_dir)
+                                 if os.path.isdir(os.path.join(self.shards_dir, name))))
+        return shards
+
+
+def fan_out(targets: Dict[str, Any], fn: Callable[[Any], Any], max_workers: Optional[int] = None):
+    """用线程池并发地对每个分片执行 fn，返回 ({分片: 结果}, {分片: 耗时毫秒})"""
+    if not targets:
+        return {}, {}
+
+    def timed(item):
+        name, target = item
+        start = time.perf_counter()
+        result = fn(target)
+        return name, result, (time.perf_counter() - start) * 1000
+
+    results, latency_ms = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+        for name, result, elapsed in executor.map(timed, targets.items()):
+            results[name] = result
+            latency_ms[name] = round(elapsed, 2)
+    return results, latency_ms
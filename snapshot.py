@@ -0,0 +1,285 @@
+import numpy as np
+import hashlib
+import os
+import json
+import shutil
+import time
+from contextlib import ExitStack
+from typing import Dict, List
+
+SNAPSHOT_VERSION = 1
+
+
+def _content_hash(document, metadata):
+    payload = json.dumps([document, metadata], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _state_dirs(processor):
+    """需要随快照保存的索引目录：快照内的子目录名 -> 本地目录"""
+    return {
+        "concept_index": processor.concept_index.store_dir,
+        "chunk_similarity": processor.chunk_similarity.store_dir,
+        "centroid_index": processor.centroid_index.store_dir,
+    }
+
+
+def _file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _upload_hashes(uploads_dir):
+    """上传目录中每个文件的 {文件名: 内容哈希}"""
+    if not os.path.exists(uploads_dir):
+        return {}
+    return {name: _file_hash(os.path.join(uploads_dir, name)) for name in sorted(os.listdir(uploads_dir))
+            if os.path.isfile(os.path.join(uploads_dir, name))}
+
+
+def _base_dir(snapshot_dir, manifest):
+    """增量快照的基准快照目录：manifest 中只记录基准快照的名称，在本快照所在的目录中查找，
+    整条快照链可以一起移动到其他目录或实例"""
+    base = manifest.get("base")
+    if not base:
+        return None
+    if os.path.isabs(base) and os.path.exists(base):
+        # 兼容早期记录绝对路径的快照
+        return base
+    return os.path.join(os.path.dirname(os.path.abspath(snapshot_dir)), os.path.basename(base))
+
+
+def read_manifest(snapshot_dir):
+    with open(os.path.join(snapshot_dir, "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_columns(snapshot_dir):
+    with open(os.path.join(snapshot_dir, "chunks.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def export_snapshot(processor, snapshot_dir, dtype="float16", base_dir=None, extra_files=None,
+                    uploads_dir="./data/uploads", include_files=True, page_size=5000):
+    """把运行中的知识库导出为快照目录
+
+    - embeddings.npy: 所有块向量组成的连续 float16/float32 数组，导入时可直接内存映射
+    - chunks.json: 按列存储的块ID、文本、元数据和内容哈希
+    - 概念缓存、块级相似度、中心向量等索引目录，以及 extra_files（如布局缓存）
+    - files: 上传的原始文件，manifest 中的 files 记录快照最终状态下每个文件的内容哈希
+    指定 base_dir 时只导出相对基准快照新增或变化的块和文件，并记录被删除的块ID和文件名（增量备份）。
+    """
+    if dtype not in ("float16", "float32"):
+        raise ValueError(f"不支持的向量精度: {dtype}")
+    if base_dir is not None:
+        if os.path.abspath(base_dir) == os.path.abspath(snapshot_dir):
+            raise ValueError("增量快照不能覆盖它的基准快照")
+        if os.path.dirname(os.path.abspath(base_dir)) != os.path.dirname(os.path.abspath(snapshot_dir)):
+            raise ValueError("基准快照必须与增量快照位于同一目录")
+    if os.path.exists(snapshot_dir):
+        # 只覆盖已有的快照目录，避免误删其他目录
+        if not os.path.exists(os.path.join(snapshot_dir, "manifest.json")):
+            raise ValueError(f"目录已存在且不是快照，拒绝覆盖: {snapshot_dir}")
+        shutil.rmtree(snapshot_dir)
+    os.makedirs(snapshot_dir)
+
+    base_hashes, base_files = {}, {}
+    if base_dir is not None:
+        base_hashes = snapshot_hashes(base_dir)
+        base_files = read_manifest(base_dir).get("files", {})
+
+    with processor._lock, ExitStack() as stack:
+        # 持有所有分片锁直到导出结束：入库只在分片锁内写入向量库，导出期间块数不会超过 total；
+        # 压缩需要 processor._lock，也不会在导出过程中替换分片
+        shards = list(processor.shards)
+        for shard in shards:
+            stack.enter_context(processor._shard_lock(shard))
+        collections = [processor.shards[shard]._collection for shard in shards]
+        total = sum(collection.count() for collection in collections)
+
+        columns = {"ids": [], "documents": [], "metadatas": [], "hashes": []}
+        seen = set()
+        embeddings = None
+        row = 0
+        for collection in collections:
+            offset = 0
+            while True:
+                page = collection.get(include=["embeddings", "documents", "metadatas"],
+                                      limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                offset += len(page["ids"])
+
+                if embeddings is None:
+                    # 直接写入磁盘上的 .npy，避免在内存中拼接整个向量矩阵
+                    embeddings = np.lib.format.open_memmap(
+                        os.path.join(snapshot_dir, "embeddings.npy"), mode="w+",
+                        dtype=dtype, shape=(total, len(page["embeddings"][0])))
+
+                keep = []
+                for i, (chunk_id, document, metadata) in enumerate(
+                        zip(page["ids"], page["documents"], page["metadatas"])):
+                    content_hash = _content_hash(document, metadata)
+                    seen.add(chunk_id)
+                    if base_hashes.get(chunk_id) == content_hash:
+                        continue
+                    keep.append(i)
+                    columns["ids"].append(chunk_id)
+                    columns["documents"].append(document)
+                    columns["metadatas"].append(metadata)
+                    columns["hashes"].append(content_hash)
+
+                if keep:
+                    vectors = np.asarray(page["embeddings"], dtype=np.float32)[keep]
+                    embeddings[row:row + len(keep)] = vectors.astype(dtype)
+                    row += len(keep)
+
+        if embeddings is not None:
+            embeddings.flush()
+            del embeddings
+            if row < total:
+                # 增量快照只保留实际导出的行
+                trimmed = np.load(os.path.join(snapshot_dir, "embeddings.npy"), mmap_mode="r")[:row].copy()
+                np.save(os.path.join(snapshot_dir, "embeddings.npy"), trimmed)
+
+        with open(os.path.join(snapshot_dir, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(columns, f, ensure_ascii=False)
+
+        for name, path in _state_dirs(processor).items():
+            if os.path.exists(path):
+                shutil.copytree(path, os.path.join(snapshot_dir, "state", name))
+        for path in extra_files or []:
+            if os.path.exists(path):
+                os.makedirs(os.path.join(snapshot_dir, "extra"), exist_ok=True)
+                shutil.copy2(path, os.path.join(snapshot_dir, "extra", os.path.basename(path)))
+        files = _upload_hashes(uploads_dir) if include_files else {}
+        for name, file_hash in files.items():
+            # 增量快照只复制新增或内容变化的文件
+            if base_files.get(name) == file_hash:
+                continue
+            os.makedirs(os.path.join(snapshot_dir, "files"), exist_ok=True)
+            shutil.copy2(os.path.join(uploads_dir, name), os.path.join(snapshot_dir, "files", name))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": int(time.time()),
+        "chunks": row,
+        "dimension": 0 if not columns["ids"] else int(np.load(
+            os.path.join(snapshot_dir, "embeddings.npy"), mmap_mode="r").shape[1]),
+        "dtype": dtype,
+        "base": os.path.basename(os.path.abspath(base_dir)) if base_dir else None,
+        "removed": sorted(set(base_hashes) - seen),
+        "files": files,
+        "removed_files": sorted(set(base_files) - set(files)) if include_files else [],
+        "extra_files": [os.path.basename(path) for path in extra_files or [] if os.path.exists(path)],
+    }
+    with open(os.path.join(snapshot_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    return manifest
+
+
+def snapshot_hashes(snapshot_dir):
+    """返回快照（含其增量链）最终状态下的 {块ID: 内容哈希}"""
+    manifest = read_manifest(snapshot_dir)
+    base_dir = _base_dir(snapshot_dir, manifest)
+    hashes = snapshot_hashes(base_dir) if base_dir else {}
+    for chunk_id in manifest["removed"]:
+        hashes.pop(chunk_id, None)
+    columns = _read_columns(snapshot_dir)
+    hashes.update(zip(columns["ids"], columns["hashes"]))
+    return hashes
+
+
+def diff_snapshots(old_dir, new_dir):
+    """比较两个快照，返回新增、删除和内容变化的块ID"""
+    old = snapshot_hashes(old_dir)
+    new = snapshot_hashes(new_dir)
+    return {
+        "added": sorted(set(new) - set(old)),
+        "removed": sorted(set(old) - set(new)),
+        "changed": sorted(chunk_id for chunk_id in set(old) & set(new) if old[chunk_id] != new[chunk_id]),
+    }
+
+
+def import_snapshot(processor, snapshot_dir, extra_dir="./data", uploads_dir="./data/uploads",
+                    batch_size=5000):
+    """从快照恢复知识库：内存映射读取向量后直接写入分片，不调用任何外部 API"""
+    manifest = read_manifest(snapshot_dir)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"不支持的快照版本: {manifest['version']}")
+    # 增量快照先恢复它的基准快照
+    base_dir = _base_dir(snapshot_dir, manifest)
+    if base_dir:
+        import_snapshot(processor, base_dir, extra_dir, uploads_dir, batch_size)
+
+    columns = _read_columns(snapshot_dir)
+    with processor._lock:
+        if manifest["removed"]:
+            for collection in processor._collections():
+                collection.delete(ids=manifest["removed"])
+            if processor.vector_index is not None:
+                processor.vector_index.remove_ids(manifest["removed"])
+
+        if columns["ids"]:
+            embeddings = np.load(os.path.join(snapshot_dir, "embeddings.npy"), mmap_mode="r")
+
+            # 按当前实例的分片配置重新路由
+            by_shard: Dict[str, List[int]] = {}
+            for i, metadata in enumerate(columns["metadatas"]):
+                shard = processor.router.shard_for(metadata.get("file_path", ""), metadata.get("notebook"))
+                by_shard.setdefault(shard, []).append(i)
+
+            for shard, rows in by_shard.items():
+                if shard not in processor.shards:
+                    processor.shards[shard] = processor._open_shard(shard)
+                collection = processor.shards[shard]._collection
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    collection.upsert(
+                        ids=[columns["ids"][i] for i in batch],
+                        embeddings=np.asarray(embeddings[batch], dtype=np.float32).tolist(),
+                        documents=[columns["documents"][i] for i in batch],
+                        metadatas=[columns["metadatas"][i] for i in batch],
+                    )
+                processor.shards[shard].persist()
+
+            # 启用了进程内量化索引时同步写入
+            if processor.vector_index is not None:
+                by_file: Dict[str, List[int]] = {}
+                for i, metadata in enumerate(columns["metadatas"]):
+                    by_file.setdefault(metadata.get("file_path", ""), []).append(i)
+                for file_path, rows in by_file.items():
+                    processor.vector_index.add([columns["ids"][i] for i in rows],
+                                               np.asarray(embeddings[rows], dtype=np.float32), file_path)
+
+        # 恢复索引目录并重新加载
+        for name, path in _state_dirs(processor).items():
+            source = os.path.join(snapshot_dir, "state", name)
+            if os.path.exists(source):
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                shutil.copytree(source, path)
+        processor.concept_index.load()
+        processor.chunk_similarity.load()
+        processor.centroid_index.load()
+        # 快照中的块按当前分片配置重新路由，中心向量记录的分片需要重新核对
+        processor._centroids_checked = False
+
+        for name in manifest["extra_files"]:
+            os.makedirs(extra_dir, exist_ok=True)
+            shutil.copy2(os.path.join(snapshot_dir, "extra", name), os.path.join(extra_dir, name))
+
+        # 删除基准快照之后被移除的上传文件
+        for name in manifest.get("removed_files", []):
+            path = os.path.join(uploads_dir, os.path.basename(name))
+            if os.path.isfile(path):
+                os.remove(path)
+        files_dir = os.path.join(snapshot_dir, "files")
+        if os.path.exists(files_dir):
+            os.makedirs(uploads_dir, exist_ok=True)
+            for name in os.listdir(files_dir):
+                shutil.copy2(os.path.join(files_dir, name), os.path.join(uploads_dir, name))
+    return manifest
@@ -0,0 +1,331 @@
+import numpy as np
+import os
+import json
+from typing import List, Dict, Optional
+
+
+class QuantizedVectorIndex:
+    """进程内的量化向量索引：向量以 int8 或 float16 存放在内存映射文件中，用 NumPy 做暴力或 IVF 检索，
+    再用全精度向量对候选重排
+
+    磁盘文件（store_dir 下），写入时只追加或原地修改，不重写整个文件：
+    - codes.bin: 量化后的向量 (capacity, dim)，int8 或 float16
+    - scales.bin: int8 量化时每行的缩放系数 (capacity,)
+    - vectors.bin: 归一化后的 float32 全精度向量 (capacity, dim)，只在重排时按行读取
+    - deleted.bin: 每行的删除标记 (capacity,)
+    - rows.jsonl: 每行一条 [块ID, 所属文档]，只追加
+    - meta.json: 量化类型、维度和容量，只在扩容、训练 IVF 和 rebuild 时改写
+    - ivf_centroids.npy / assignments.bin: 训练 IVF 后的聚类中心和每行所属的列表 (capacity,)
+    """
+
+    def __init__(self, store_dir="./data/vector_index", dtype="int8", rerank_factor=4):
+        if dtype not in ("int8", "float16"):
+            raise ValueError(f"不支持的量化类型: {dtype}")
+        self.store_dir = store_dir
+        self.dtype = dtype
+        self.rerank_factor = rerank_factor  # 量化检索取 k * rerank_factor 个候选再重排
+
+        self.dim = 0
+        self.capacity = 0
+        self.ids: List[str] = []
+        self.file_paths: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        # 文档 -> 它写入过的所有行（可能包含已删除的行，使用时按删除标记过滤）
+        self.rows_of_file: Dict[str, List[int]] = {}
+
+        # IVF：聚类中心及每行所属的列表
+        self.ivf_centroids: Optional[np.ndarray] = None
+
+        self.codes = self.scales = self.vectors = self.deleted = self.assignments = None
+        self.load()
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _layout(self):
+        """内存映射文件：文件名 -> (元素类型, 每行的形状)"""
+        layout = {
+            "codes.bin": (np.int8 if self.dtype == "int8" else np.float16, (self.dim,)),
+            "scales.bin": (np.float32, ()),
+            "vectors.bin": (np.float32, (self.dim,)),
+            "deleted.bin": (np.bool_, ()),
+        }
+        if self.ivf_centroids is not None:
+            layout["assignments.bin"] = (np.int32, ())
+        return layout
+
+    def _allocate(self, capacity):
+        """把内存映射文件扩展（或创建）到给定容量后重新打开，新增部分以 0 填充"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.codes = self.scales = self.vectors = self.deleted = self.assignments = None
+        arrays = {}
+        for name, (dtype, row_shape) in self._layout().items():
+            row_bytes = np.dtype(dtype).itemsize * int(np.prod(row_shape))
+            with open(self._path(name), "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+            arrays[name] = np.memmap(self._path(name), dtype=dtype, mode="r+", shape=(capacity,) + row_shape)
+        self.codes = arrays["codes.bin"]
+        self.scales = arrays["scales.bin"]
+        self.vectors = arrays["vectors.bin"]
+        self.deleted = arrays["deleted.bin"]
+        self.assignments = arrays.get("assignments.bin")
+        if capacity != self.capacity:
+            self.capacity = capacity
+            self._write_meta()
+
+    def _write_meta(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        meta = {"dtype": self.dtype, "dim": self.dim, "capacity": self.capacity}
+        with open(self._path("meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    def _append_rows(self, ids, file_path):
+        with open(self._path("rows.jsonl"), "a", encoding="utf-8") as f:
+            for chunk_id in ids:
+                f.write(json.dumps([chunk_id, file_path], ensure_ascii=False) + "\n")
+
+    def load(self):
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dtype = meta["dtype"]
+        self.dim = meta["dim"]
+        if os.path.exists(self._path("ivf_centroids.npy")):
+            self.ivf_centroids = np.load(self._path("ivf_centroids.npy"))
+        if os.path.exists(self._path("rows.jsonl")):
+            with open(self._path("rows.jsonl"), "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        chunk_id, file_path = json.loads(line)
+                        self.ids.append(chunk_id)
+                        self.file_paths.append(file_path)
+        self.capacity = meta["capacity"]
+        if self.capacity:
+            self._allocate(max(self.capacity, len(self.ids)))
+        for i, (chunk_id, file_path) in enumerate(zip(self.ids, self.file_paths)):
+            self.rows_of_file.setdefault(file_path, []).append(i)
+            if not self.deleted[i]:
+                self.row_of[chunk_id] = i
+
+    def save(self):
+        """把内存映射文件中的改动写回磁盘"""
+        for array in (self.codes, self.scales, self.vectors, self.deleted, self.assignments):
+            if array is not None:
+                array.flush()
+
+    def _ensure_capacity(self, needed):
+        """容量不足时按倍数扩展内存映射文件"""
+        if needed <= self.capacity:
+            return
+        self._allocate(max(needed, self.capacity * 2, 1024))
+
+    def _quantize(self, vectors):
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), np.ones(len(vectors), dtype=np.float32)
+        # 对称的逐行 int8 量化
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.clip(np.round(vectors / scales[:, np.newaxis]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def add(self, ids, embeddings, file_path):
+        """追加一个文档的块向量，已存在的块ID会先被标记删除"""
+        if not ids:
+            return
+        vectors = self._normalize(embeddings)
+        if not self.dim:
+            self.dim = vectors.shape[1]
+
+        start = len(self.ids)
+        self._ensure_capacity(start + len(ids))
+        for chunk_id in ids:
+            if chunk_id in self.row_of:
+                self.deleted[self.row_of.pop(chunk_id)] = True
+
+        codes, scales = self._quantize(vectors)
+        self.codes[start:start + len(ids)] = codes
+        self.scales[start:start + len(ids)] = scales
+        self.vectors[start:start + len(ids)] = vectors
+        self.deleted[start:start + len(ids)] = False
+        if self.ivf_centroids is not None:
+            self.assignments[start:start + len(ids)] = np.argmax(vectors @ self.ivf_centroids.T, axis=1)
+        self.save()
+        # 向量写入磁盘后再追加行记录，中途失败时只会留下未登记的空行
+        self._append_rows(ids, file_path)
+
+        for offset, chunk_id in enumerate(ids):
+            self.row_of[chunk_id] = start + offset
+        self.ids.extend(ids)
+        self.file_paths.extend([file_path] * len(ids))
+        self.rows_of_file.setdefault(file_path, []).extend(range(start, start + len(ids)))
+
+    def remove_document(self, file_path):
+        """把文档的所有块标记为删除（空间在 rebuild 时回收）"""
+        rows = self.rows_of_file.pop(file_path, [])
+        if not rows:
+            return
+        self.deleted[rows] = True
+        for i in rows:
+            self.row_of.pop(self.ids[i], None)
+        self.save()
+
+    def remove_ids(self, ids):
+        """按块ID标记删除"""
+        rows = [self.row_of.pop(chunk_id) for chunk_id in ids if chunk_id in self.row_of]
+        if not rows:
+            return
+        self.deleted[rows] = True
+        self.save()
+
+    def get_vectors(self, file_path):
+        """返回文档的块ID和全精度向量"""
+        rows = np.asarray(self.rows_of_file.get(file_path, []), dtype=np.int64)
+        if not len(rows):
+            return [], np.empty((0, self.dim), dtype=np.float32)
+        rows = rows[~np.asarray(self.deleted[rows])]
+        return [self.ids[i] for i in rows], np.asarray(self.vectors[rows])
+
+    def train_ivf(self, nlist=None, iterations=10, sample_size=20000, seed=42):
+        """用 k-means 训练 IVF 聚类中心，之后的检索只扫描最近的 nprobe 个列表"""
+        n = len(self.ids)
+        live = np.flatnonzero(~np.asarray(self.deleted[:n]))
+        if not len(live):
+            return
+        nlist = nlist or max(int(np.sqrt(len(live))), 1)
+        rng = np.random.default_rng(seed)
+        sample = self.vectors[np.sort(rng.choice(live, size=min(sample_size, len(live)), replace=False))]
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        self.ivf_centroids = centroids
+        np.save(self._path("ivf_centroids.npy"), centroids)
+        self._allocate(self.capacity)
+        for start in range(0, n, 65536):
+            block = np.asarray(self.vectors[start:min(start + 65536, n)])
+            self.assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self.save()
+
+    def _approximate_scores(self, queries, rows):
+        """用量化向量计算查询与给定行的近似内积"""
+        codes = np.asarray(self.codes[rows], dtype=np.float32)
+        return (queries @ codes.T) * np.asarray(self.scales[rows])[np.newaxis, :]
+
+    def _top_candidates(self, queries, rows, candidates_k, block_bytes):
+        """分块计算近似分数，返回每个查询分数最高的 candidates_k 个候选行 (Q, <=candidates_k)
+
+        每块的行数按字节数确定，使解码后的 float32 向量块和 (Q, 块行数) 的分数矩阵都不超过 block_bytes；
+        每块先用 argpartition 只留下 candidates_k 个候选，再与之前的候选合并，不保留整块的行号副本。
+        """
+        step = max(block_bytes // (4 * max(self.dim, len(queries), 1)), 256)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            scores = self._approximate_scores(queries, block)
+            if len(block) > candidates_k:
+                keep = np.argpartition(-scores, candidates_k - 1, axis=1)[:, :candidates_k]
+                block_rows = block[keep]
+                scores = np.take_along_axis(scores, keep, axis=1)
+            else:
+                block_rows = np.broadcast_to(block, scores.shape)
+            best_rows = np.hstack([best_rows, block_rows])
+            best_scores = np.hstack([best_scores, scores])
+            if best_rows.shape[1] > candidates_k:
+                keep = np.argpartition(-best_scores, candidates_k - 1, axis=1)[:, :candidates_k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+        return best_rows
+
+    def search(self, query_embeddings, k=5, nprobe=None, exclude_file_path=None, block_bytes=8 << 20):
+        """批量检索：返回每个查询的 [(块ID, 文件路径, 余弦相似度), ...]
+
+        nprobe 为 None 时暴力扫描全部向量；否则只扫描 IVF 中最近的 nprobe 个列表。
+        block_bytes 限制每块解码向量和分数矩阵的大小，决定检索时的峰值内存。
+        """
+        n = len(self.ids)
+        queries = self._normalize(query_embeddings)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+
+        valid = ~np.asarray(self.deleted[:n])
+        if exclude_file_path is not None:
+            valid[self.rows_of_file.get(exclude_file_path, [])] = False
+        candidates_k = k * self.rerank_factor
+
+        if nprobe is not None and self.ivf_centroids is not None:
+            # IVF：每个查询只扫描最近的 nprobe 个列表
+            candidates = []
+            for q in queries:
+                probes = np.argsort(-(self.ivf_centroids @ q))[:nprobe]
+                rows = np.flatnonzero(valid & np.isin(self.assignments[:n], probes))
+                if len(rows) > candidates_k:
+                    rows = self._top_candidates(q[np.newaxis, :], rows, candidates_k, block_bytes)[0]
+                candidates.append(rows)
+        else:
+            # 暴力扫描：按块解码量化向量，所有查询共享一次解码
+            candidates = list(self._top_candidates(queries, np.flatnonzero(valid), candidates_k, block_bytes))
+
+        # 第二阶段：用全精度向量对候选重排
+        results = []
+        for q, rows in zip(queries, candidates):
+            if not len(rows):
+                results.append([])
+                continue
+            rows = np.sort(rows)
+            exact = np.asarray(self.vectors[rows]) @ q
+            order = np.argsort(-exact)[:k]
+            results.append([(self.ids[rows[i]], self.file_paths[rows[i]], float(exact[i])) for i in order])
+        return results
+
+    def rebuild(self):
+        """压缩：去掉已删除的行并重写内存映射文件和行记录"""
+        n = len(self.ids)
+        live = np.flatnonzero(~np.asarray(self.deleted[:n])) if n else np.empty(0, dtype=np.int64)
+        codes = np.asarray(self.codes[live]) if len(live) else None
+        scales = np.asarray(self.scales[live]) if len(live) else None
+        vectors = np.asarray(self.vectors[live]) if len(live) else None
+        assignments = np.asarray(self.assignments[live]) if self.assignments is not None and len(live) else None
+
+        self.ids = [self.ids[i] for i in live]
+        self.file_paths = [self.file_paths[i] for i in live]
+        self.row_of = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.rows_of_file = {}
+        for i, file_path in enumerate(self.file_paths):
+            self.rows_of_file.setdefault(file_path, []).append(i)
+
+        self.codes = self.scales = self.vectors = self.deleted = self.assignments = None
+        for name in list(self._layout()) + ["rows.jsonl"]:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self.capacity = 0
+        os.makedirs(self.store_dir, exist_ok=True)
+        if len(live):
+            self._allocate(len(live))
+            self.codes[:] = codes
+            self.scales[:] = scales
+            self.vectors[:] = vectors
+            if assignments is not None:
+                self.assignments[:] = assignments
+            self.save()
+        with open(self._path("rows.jsonl"), "w", encoding="utf-8") as f:
+            for chunk_id, file_path in zip(self.ids, self.file_paths):
+                f.write(json.dumps([chunk_id, file_path], ensure_ascii=False) + "\n")
+        self._write_meta()